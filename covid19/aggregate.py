@@ -0,0 +1,127 @@
+'''
+Per-region totals of the daily reports. Each report is read once and
+summed up for every countryRegion at the same time (and, optionally,
+every provinceState as 'Country/Province'), into a columnar table:
+
+    table.days      datetime64[D] array, one entry per day, sorted
+    table.regions   region names, one per column
+    table.values    int64 array [day, region, metric], metrics as in METRICS
+
+so any region's series is a slice. The totals are kept in the SQLite
+store (store.py), which builds the table:
+
+    table = Store().table()
+    table.series('Italy')['deaths']
+    table.latest('US')
+    table.query(['US', 'Italy'], '2021-03-01', '2021-03-07')
+
+From the command line:
+
+    python3 aggregate.py US China --last 7
+    python3 aggregate.py --list
+'''
+from sys import exit
+import argparse
+
+import numpy as np
+
+METRICS = ('confirmed', 'deaths', 'recovered')
+
+
+def _int(value):
+    # Reports have blanks and nulls here and there
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def aggregate(report, provinces=False):
+    '''{region: [confirmed, deaths, recovered]} over one daily report.'''
+    totals = {}
+    for row in report:
+        counts = [_int(row.get(metric)) for metric in METRICS]
+        country = (row.get('countryRegion') or '').strip()
+        keys = [country]
+        province = (row.get('provinceState') or '').strip()
+        if provinces and province:
+            keys.append(country + '/' + province)
+        for key in keys:
+            total = totals.get(key)
+            if total is None:
+                totals[key] = counts[:]
+            else:
+                for i, count in enumerate(counts):
+                    total[i] += count
+    return totals
+
+
+class RegionTable:
+    def __init__(self, days=None, regions=(), values=None, provinces=False):
+        self.days = np.array([], 'datetime64[D]') if days is None else days
+        self.regions = list(regions)
+        self.values = np.zeros((0, 0, len(METRICS)), np.int64) if values is None else values
+        self.provinces = provinces
+        self._index()
+
+    def _index(self):
+        self.columns = {region: i for i, region in enumerate(self.regions)}
+        self.rows = {day: i for i, day in enumerate(self.days.tolist())}
+
+    def __len__(self):
+        return len(self.days)
+
+    def series(self, region):
+        '''{'days': ..., 'confirmed': ..., ...} arrays for one region.'''
+        column = self.columns.get(region)
+        if column is None:
+            raise KeyError('no region {!r}'.format(region))
+        series = {'days': self.days}
+        for i, metric in enumerate(METRICS):
+            series[metric] = self.values[:, column, i]
+        return series
+
+    def span(self, start=None, end=None):
+        '''Rows (i, j) of the days from start to end (ISO dates, both included).'''
+        i = 0 if start is None else np.searchsorted(self.days, np.datetime64(start, 'D'), 'left')
+        j = len(self.days) if end is None else np.searchsorted(
+            self.days, np.datetime64(end, 'D'), 'right')
+        return int(i), int(j)
+
+    def query(self, regions, start=None, end=None):
+        '''{region: series()} sliced to the days from start to end.'''
+        i, j = self.span(start, end)
+        result = {}
+        for region in regions:
+            result[region] = {key: values[i:j]
+                              for key, values in self.series(region).items()}
+        return result
+
+    def latest(self, region):
+        '''{metric: count} on the last day.'''
+        column = self.columns[region]
+        return dict(zip(METRICS, self.values[-1, column].tolist()))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Query the aggregated daily reports')
+    parser.add_argument('regions', nargs='*', help="e.g. US, China or 'US/New York'")
+    parser.add_argument('--last', type=int, default=10, help='days to show')
+    parser.add_argument('--list', action='store_true', help='list the regions')
+    parser.add_argument('--path', default=None, help='the store (data/covid19.db)')
+    args = parser.parse_args()
+
+    from store import Store, PATH
+    table = Store(args.path or PATH).table()
+    if not len(table):
+        exit('No days stored yet in {}: run covid19_fetch.py first'.format(args.path or PATH))
+    if args.list or not args.regions:
+        print('{} days, {} to {}; {} regions:'.format(
+            len(table), table.days[0], table.days[-1], len(table.regions)))
+        print(', '.join(sorted(table.regions)))
+    for region in args.regions:
+        series = table.series(region)
+        print(region)
+        for i in range(max(0, len(table) - args.last), len(table)):
+            print('  {}  {}'.format(series['days'][i], '  '.join(
+                '{}={}'.format(metric, series[metric][i]) for metric in METRICS)))
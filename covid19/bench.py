@@ -0,0 +1,153 @@
+'''
+Benchmarks for the COVID-19 pipeline on a made up dataset the size of
+the real one (every day since 01-22-2020, countries and provinces), e.g.
+
+    python3 bench.py metrics --regions 800
+    python3 bench.py query --days 7
+'''
+import argparse
+import datetime
+import math
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from aggregate import METRICS, RegionTable
+from metrics import ARRAYS, Metrics, WINDOW
+from store import Store, api_day
+
+FIRST_DAY = np.datetime64('2020-01-22')
+
+
+def synthetic_table(regions, days=None, seed=0):
+    '''A RegionTable of growing, noisy totals.'''
+    if days is None:
+        days = (np.datetime64(datetime.date.today()) - FIRST_DAY).astype(int)
+    rng = np.random.default_rng(seed)
+    # Daily new counts, then their running sum so the totals never drop
+    scale = rng.uniform(1, 1000, (1, regions, 1)) * np.array([1, 0.02, 0.5])
+    new = rng.poisson(scale * np.linspace(0, 1, days)[:, None, None])
+    names = ['Country {}'.format(i) if i % 4 == 0 else 'Country {}/Province {}'.format(i // 4, i)
+             for i in range(regions)]
+    return RegionTable(FIRST_DAY + np.arange(days), names,
+                       np.cumsum(new, axis=0).astype(np.int64))
+
+
+def timed(function, *args, repeat=1):
+    '''(best time in seconds, result) over repeat calls.'''
+    best = math.inf
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def loop_metrics(table):
+    # What the page (or a script) does today: one series at a time
+    out = {}
+    for column, region in enumerate(table.regions):
+        for m, metric in enumerate(METRICS):
+            totals = table.values[:, column, m].tolist()
+            new = [b - a for a, b in zip([0] + totals, totals)]
+            rolling = [sum(new[i - WINDOW + 1:i + 1]) / WINDOW if i >= WINDOW - 1 else None
+                       for i in range(len(new))]
+            doubling = []
+            for i, total in enumerate(totals):
+                before = totals[i - WINDOW] if i >= WINDOW else 0
+                growth = math.log(total / before) if before > 0 and total > 0 else 0
+                doubling.append(WINDOW * math.log(2) / growth if growth > 0 else None)
+            out[region, metric] = new, rolling, doubling
+    return out
+
+
+def bench_metrics(args):
+    table = synthetic_table(args.regions, args.days)
+    print('{} days x {} regions x {} metrics'.format(
+        len(table), len(table.regions), len(METRICS)))
+
+    seconds, metrics = timed(Metrics, table, repeat=args.repeat)
+    print('vectorized, all at once:  {:8.1f} ms'.format(seconds * 1e3))
+    if not args.skip_loop:
+        seconds, _ = timed(loop_metrics, table)
+        print('per-region Python loop:   {:8.1f} ms'.format(seconds * 1e3))
+
+    # The fetcher appending one more day
+    last = RegionTable(table.days[:-1], table.regions, table.values[:-1])
+
+    def one_more_day():
+        metrics = Metrics(last)
+        t0 = time.perf_counter()
+        metrics.update(table)
+        return time.perf_counter() - t0
+    seconds = min(one_more_day() for _ in range(args.repeat))
+    print('update, one more day:     {:8.1f} ms'.format(seconds * 1e3))
+
+    for kind in ('rolling', 'doubling'):
+        seconds, top = timed(metrics.ranking, kind, 'confirmed', -1, 10, True,
+                             repeat=args.repeat)
+        print('ranking by {:<9}      {:8.3f} ms  (first: {})'.format(
+            kind + ':', seconds * 1e3, top[0][0]))
+    print('memory: {:.0f} MB'.format(sum(getattr(metrics, name).nbytes for name in ARRAYS) / 1e6))
+
+
+def bench_query(args):
+    table = synthetic_table(args.regions)
+    path = os.path.join(tempfile.mkdtemp(prefix='bench_'), 'covid19.db')
+    store = Store(path)
+    t0 = time.perf_counter()
+    store.append([(api_day(str(day)), {region: table.values[i, column].tolist()
+                                       for column, region in enumerate(table.regions)})
+                  for i, day in enumerate(table.days)])
+    print('{} days x {} regions, stored in {:.1f}s ({:.0f} MB)'.format(
+        len(table), len(table.regions), time.perf_counter() - t0,
+        os.path.getsize(path) / 1e6))
+
+    # Random weeks (or whatever --days) of random regions
+    rng = random.Random(0)
+    queries = []
+    for _ in range(args.queries):
+        i = rng.randrange(len(table) - args.days)
+        queries.append((rng.sample(table.regions, args.per_query),
+                        str(table.days[i]), str(table.days[i + args.days - 1])))
+
+    def run(query):
+        t0 = time.perf_counter()
+        for regions, start, end in queries:
+            query(regions, start, end)
+        return (time.perf_counter() - t0) / len(queries)
+
+    print('query of {} region(s) x {} days:'.format(args.per_query, args.days))
+    seconds, _ = timed(store.table)
+    print('  load everything (once):   {:9.1f} ms'.format(seconds * 1e3))
+    print('  SQLite (region, day) key: {:9.3f} ms'.format(run(store.query) * 1e3))
+    print('  in-memory, binary search: {:9.3f} ms'.format(run(table.query) * 1e3))
+    store.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='COVID-19 pipeline benchmarks')
+    sub = parser.add_subparsers(dest='bench', required=True)
+
+    p = sub.add_parser('metrics', help='derived metrics: vectorized vs. loop, '
+                                       'incremental update, rankings')
+    p.add_argument('--regions', type=int, default=800)
+    p.add_argument('--days', type=int, default=None,
+                   help='default: every day since 01-22-2020')
+    p.add_argument('--repeat', type=int, default=3)
+    p.add_argument('--skip-loop', action='store_true',
+                   help="don't time the (slow) per-region loop")
+    p.set_defaults(func=bench_metrics)
+
+    p = sub.add_parser('query', help='range queries: SQLite index vs. in-memory table')
+    p.add_argument('--regions', type=int, default=800)
+    p.add_argument('--days', type=int, default=7, help='days per query')
+    p.add_argument('--per-query', type=int, default=1, help='regions per query')
+    p.add_argument('--queries', type=int, default=1000)
+    p.set_defaults(func=bench_query)
+
+    args = parser.parse_args()
+    args.func(args)
@@ -1,10 +1,22 @@
+import argparse
 import datetime
-import urllib2
-import json
-import time
-import os, sys
+import os
+
+from aggregate import aggregate
+from fetcher import DailyFetcher, FetchError, URL, WORKERS, dates
+from store import Store
+
+parser = argparse.ArgumentParser(description='Fetch the daily COVID-19 reports')
+parser.add_argument('--url', default=URL,
+                    help='daily reports API (e.g. a local stub_server.py)')
+parser.add_argument('--workers', type=int, default=WORKERS,
+                    help='days fetched at the same time')
+parser.add_argument('--region', default='US',
+                    help="region for data.json (e.g. China, or 'US/New York')")
+parser.add_argument('--migrate-region', default='US',
+                    help='region of an old data.json, imported into an empty store')
+args = parser.parse_args()
 
-url = "https://covid19.mathdro.id/api/daily"
 dirname = "data"
 filename = "data.json"
 filepath = os.path.join(dirname,filename)
@@ -12,58 +24,49 @@ filepath = os.path.join(dirname,filename)
 if not os.path.exists(dirname):
     os.mkdir(dirname)
 
-if not os.path.isfile(filepath):
-    with open(filepath,'w') as file:
-	file.close()
-
-dt = datetime.datetime(2020, 1, 22)
+start = datetime.date(2020, 1, 22)
 end = datetime.date.today()
-end = datetime.datetime(end.year, end.month, end.day)
-step = datetime.timedelta(hours=24)
 
-region = "US"
-#region = "China"
+region = args.region
+
+# Raw reports are cached in data/raw, so days are only downloaded once
+fetcher = DailyFetcher(url=args.url, cache_dir=os.path.join(dirname, 'raw'),
+                       workers=args.workers)
+
+# Totals for every region and province, one row per region and day
+store = Store(os.path.join(dirname, 'covid19.db'))
+if os.path.isfile(filepath) and not store.days():
+    print("{} days migrated from {}".format(
+        store.migrate_json(filepath, args.migrate_region), filepath))
+# Days migrated from data.json only have one region, fetch them again too
+fetched = store.days(source='api')
+missing = [date for date in dates(start, end) if date not in fetched]
+print("{} days stored, {} to fetch".format(len(store.days()), len(missing)))
 
-data_out = {}
-with open(filepath, "r+") as file:
-    try:
-        data_out = json.load(file)
-    except:
-        print("No JSON data found")
-    while dt < end:
-        daily_confirmed = 0
-        daily_deaths = 0
-        daily_recovered = 0
+days = []
+try:
+    for date, data_in in fetcher.fetch_all(missing):
+        if data_in is None:
+            print("no data for "+date)
+            continue
+        days.append((date, aggregate(data_in, provinces=True)))
+except FetchError as e:
+    # Keep what was fetched so far; the next run picks up from there
+    print("giving up: {}".format(e))
+print("{cached} cached, {fetched} fetched, {retries} retries, "
+      "{missing} not published".format(**fetcher.stats))
+# One transaction: either all of these days are stored or none
+store.append(days)
 
-	date = dt.strftime('%m-%d-%Y')
-        if date in data_out.keys():
-            print("data found for "+date)
-        else:
-            print("fetching data for "+date)
-	    response = urllib2.urlopen(url+'/'+date)
-	    data_in = json.load(response)   
-	    for d in data_in:
-		if(region == d['countryRegion']):
-		    try: 
-			daily_confirmed+=int(d['confirmed'])
-		    except ValueError:
-			daily_confirmed+=0
-		    try: 
-			daily_deaths+=int(d['deaths'])
-		    except ValueError:
-			daily_deaths+=0
-		    try: 
-			daily_recovered+=int(d['recovered'])
-		    except ValueError:
-			daily_recovered+=0
-            entry = {}
-            entry["confirmed"] = str(daily_confirmed)
-            entry["deaths"] = str(daily_deaths)
-            entry["recovered"] = str(daily_recovered)
-            data_out[date] = entry
-	dt += step
-	time.sleep(0.01)
-    file.seek(0)
-    file.write(json.dumps(data_out, sort_keys=True, 
-               indent=4, separators=(',', ': ')))
-    file.close()
+# The dashboard's data: one region's series (the stored days are kept
+# either way, and so is the old data.json)
+try:
+    store.export_json(filepath, region)
+except KeyError:
+    regions = store.regions()
+    if regions:
+        print("no region {!r} in the store, {} not written. Regions: {}".format(
+            region, filepath, ', '.join(r for r in regions if '/' not in r)))
+    else:
+        print("nothing stored yet, {} not written".format(filepath))
+store.close()
@@ -0,0 +1,159 @@
+'''
+Fetch engine for the daily reports of the COVID-19 API
+(https://covid19.mathdro.id/api/daily/<MM-DD-YYYY>).
+
+- A bounded pool of threads fetches several days at once
+- Each thread keeps its HTTP(S) connection open between requests
+- Failed requests (network errors, 5xx, 429) are retried with
+  exponential backoff; a 404 means the day isn't published (yet)
+- Every response is saved as-is to <cache>/<MM-DD-YYYY>.json, so a day
+  is downloaded once, ever
+
+    fetcher = DailyFetcher()
+    for date, report in fetcher.fetch_all(dates):
+        ...
+
+Point it at stub_server.py (url='http://localhost:8000/api/daily') to
+try it without the internet.
+'''
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import datetime
+import http.client
+import json
+import os
+import random
+import threading
+import time
+
+URL = 'https://covid19.mathdro.id/api/daily'
+CACHE_DIR = os.path.join('data', 'raw')
+WORKERS = 8
+RETRIES = 4
+BACKOFF = 0.5
+TIMEOUT = 30
+
+
+class NotPublished(Exception):
+    '''The API has no report for this date.'''
+
+
+class FetchError(Exception):
+    '''A request still failing after all the retries.'''
+
+
+class DailyFetcher:
+    def __init__(self, url=URL, cache_dir=CACHE_DIR, workers=WORKERS,
+                 retries=RETRIES, backoff=BACKOFF, timeout=TIMEOUT):
+        parts = urlsplit(url)
+        self.https = parts.scheme == 'https'
+        self.host = parts.netloc
+        self.path = parts.path.rstrip('/')
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        # One connection per pool thread
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.stats = {'cached': 0, 'fetched': 0, 'retries': 0, 'missing': 0}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _count(self, stat):
+        with self.lock:
+            self.stats[stat] += 1
+
+    def cache_path(self, date):
+        return os.path.join(self.cache_dir, date + '.json')
+
+    def cached(self, date):
+        '''The cached raw report for date, or None.'''
+        try:
+            with open(self.cache_path(date), 'rb') as f:
+                return json.loads(f.read())
+        except FileNotFoundError:
+            return None
+
+    def _connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            conn = self.local.conn = cls(self.host, timeout=self.timeout)
+        return conn
+
+    def _drop_connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+    def _get(self, date):
+        '''Raw body of the report for date, retrying what can be retried.'''
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self._count('retries')
+                # Exponential backoff, with jitter so the threads don't
+                # all come back at once
+                time.sleep(self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+            try:
+                conn = self._connection()
+                conn.request('GET', '{}/{}'.format(self.path, date))
+                response = conn.getresponse()
+                body = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                # Includes a server closing a kept-alive connection
+                self._drop_connection()
+                error = e
+                continue
+            if response.status == 200:
+                return body
+            if response.status == 404:
+                raise NotPublished(date)
+            error = '{} {}'.format(response.status, response.reason)
+            if response.status != 429 and response.status < 500:
+                break
+        raise FetchError('{}: {}'.format(date, error))
+
+    def fetch(self, date):
+        '''The report for date (a list of dicts), from the cache if possible.'''
+        report = self.cached(date)
+        if report is not None:
+            self._count('cached')
+            return report
+        body = self._get(date)
+        report = json.loads(body)
+        # Write to a temporary file first, so an interrupted run never
+        # leaves a truncated report in the cache
+        path = self.cache_path(date)
+        tmp = '{}.{}.tmp'.format(path, threading.get_ident())
+        with open(tmp, 'wb') as f:
+            f.write(body)
+        os.replace(tmp, path)
+        self._count('fetched')
+        return report
+
+    def _fetch_or_none(self, date):
+        try:
+            return self.fetch(date)
+        except NotPublished:
+            self._count('missing')
+            return None
+
+    def fetch_all(self, dates):
+        '''
+        Yield (date, report) for every date, in order; report is None for
+        days that aren't published.
+        '''
+        dates = list(dates)
+        with ThreadPoolExecutor(self.workers) as pool:
+            for date, report in zip(dates, pool.map(self._fetch_or_none, dates)):
+                yield date, report
+
+
+def dates(start, end):
+    '''API date strings from start up to (not including) end.'''
+    day = start
+    while day < end:
+        yield day.strftime('%m-%d-%Y')
+        day += datetime.timedelta(days=1)
@@ -1,9 +0,0 @@
-<?php 
-
-// This is just an example of reading server side data and sending it to the client.
-// It reads a json formatted text file and outputs it.
-
-$string = file_get_contents("data/data.json");
-echo $string;
-
-?>
@@ -0,0 +1,239 @@
+'''
+Metrics derived from the cumulative totals, for every region at once:
+
+    new       daily new cases/deaths/recoveries (difference of the totals)
+    rolling   7-day rolling mean of new, NaN for the first 6 days
+    doubling  days the totals take to double, going by the last 7 days
+              (NaN while they don't grow)
+
+All of them are arrays shaped like the totals, [day, region, metric], so
+a region is a column and a day is a row:
+
+    metrics = Metrics(Store().table())
+    metrics.series('Italy')['rolling']
+    metrics.ranking('rolling', 'deaths', n=10)
+
+Days missing from the table (reports that were never published) are
+filled with the day before, so every row is one calendar day. When the
+fetcher appends days, update() only computes the new rows:
+
+    metrics.update(Store().table())
+
+From the command line:
+
+    python3 metrics.py US Italy
+    python3 metrics.py --top 10 --by doubling
+'''
+from sys import exit
+import argparse
+
+import numpy as np
+
+from aggregate import METRICS
+
+WINDOW = 7
+SPARE_DAYS = 366
+KINDS = ('totals', 'new', 'rolling', 'doubling')
+
+
+def contiguous(days, values):
+    '''
+    Reindex [day, ...] values onto every calendar day from days[0] to
+    days[-1], filling the gaps with the day before.
+    '''
+    if not len(days):
+        return days, values
+    offsets = (days - days[0]).astype(np.int64)
+    if offsets[-1] == len(days) - 1:
+        return days, values
+    present = np.zeros(offsets[-1] + 1, np.int64)
+    present[offsets] = np.arange(len(days))
+    # Row to take for each calendar day: the last one present so far
+    rows = np.maximum.accumulate(present)
+    return days[0] + np.arange(offsets[-1] + 1), values[rows]
+
+
+def rolling_mean(cumsum, start, stop, window=WINDOW):
+    '''
+    Mean of the last window values for rows start..stop, from the running
+    sums (cumsum[i] is the sum of the first i values).
+    '''
+    rows = np.arange(start, stop)
+    out = np.full((stop - start,) + cumsum.shape[1:], np.nan)
+    full = rows >= window - 1
+    rows = rows[full]
+    out[full] = (cumsum[rows + 1] - cumsum[rows + 1 - window]) / window
+    return out
+
+
+def doubling_time(totals, start, stop, window=WINDOW):
+    '''Doubling time in days for rows start..stop, from the growth over window days.'''
+    rows = np.arange(start, stop)
+    out = np.full((stop - start,) + totals.shape[1:], np.nan)
+    full = rows >= window
+    rows = rows[full]
+    now = totals[rows].astype(np.float64)
+    before = totals[rows - window].astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = np.log(now / before)
+        out[full] = np.where((before > 0) & (growth > 0),
+                             window * np.log(2) / growth, np.nan)
+    return out
+
+
+ARRAYS = ('totals', 'new', 'cumsum', 'rolling', 'doubling')
+
+
+class Metrics:
+    def __init__(self, table=None, window=WINDOW):
+        self.window = window
+        self.regions = []
+        self.columns = {}
+        self.days = np.array([], 'datetime64[D]')
+        # The arrays have room for more days than there are, so appending
+        # one doesn't copy everything; the attributes are views of the
+        # rows in use. cumsum is the running sum of new, one row longer:
+        # cumsum[i] = new[:i].sum(0)
+        self._arrays = {}
+        for name in ARRAYS:
+            dtype = np.float64 if name in ('rolling', 'doubling') else np.int64
+            self._arrays[name] = np.zeros((1, 0, len(METRICS)), dtype)
+        self._views()
+        if table is not None:
+            self.update(table)
+
+    def __len__(self):
+        return len(self.days)
+
+    def _views(self):
+        n = len(self.days)
+        for name, array in self._arrays.items():
+            setattr(self, name, array[:n + 1 if name == 'cumsum' else n])
+
+    def _reserve(self, rows, regions):
+        '''Make room for rows days (+1 for cumsum) and regions columns.'''
+        old_regions = self._arrays['rolling'].shape[1]
+        for name, array in self._arrays.items():
+            capacity, columns = array.shape[:2]
+            if rows + 1 <= capacity and regions <= columns:
+                continue
+            if rows + 1 > capacity:
+                # Another year of daily updates before copying again
+                capacity = rows + 1 + SPARE_DAYS
+            # A region that wasn't reported yet had no cases
+            fill = np.nan if name == 'doubling' else 0
+            grown = np.full((capacity, regions, len(METRICS)), fill, array.dtype)
+            used = len(self.days) + 1
+            grown[:used, :columns] = array[:used]
+            self._arrays[name] = grown
+        n = len(self.days)
+        if n and regions > old_regions:
+            # The new regions' days so far are all zeros, but their rolling
+            # mean is NaN for the first window - 1 days, like everyone's
+            self._arrays['rolling'][:n, old_regions:regions] = rolling_mean(
+                self._arrays['cumsum'][:n + 1, old_regions:regions], 0, n, self.window)
+        self._views()
+
+    def update(self, table):
+        '''Add the days of table (a RegionTable) after the last one here.'''
+        days = table.days
+        if len(self.days):
+            days = days[days > self.days[-1]]
+        if not len(days):
+            return 0
+        rows = np.searchsorted(table.days, days)
+        if len(self.days):
+            # Back to the last day here, so gaps in between get filled
+            rows = np.concatenate([[np.searchsorted(table.days, self.days[-1])], rows])
+            days = np.concatenate([self.days[-1:], days])
+        for region in table.regions:
+            if region not in self.columns:
+                self.columns[region] = len(self.regions)
+                self.regions.append(region)
+        # Columns of the table in our order
+        values = np.zeros((len(rows), len(self.regions), len(METRICS)), np.int64)
+        values[:, [self.columns[region] for region in table.regions]] = table.values[rows]
+        days, values = contiguous(days, values)
+        if len(self.days):
+            days, values = days[1:], values[1:]
+        return self._extend(days, values)
+
+    def _extend(self, days, values):
+        start = len(self.days)
+        stop = start + len(days)
+        self._reserve(stop, len(self.regions))
+        arrays = self._arrays
+        previous = arrays['totals'][start - 1:start] if start else np.zeros_like(values[:1])
+        arrays['totals'][start:stop] = values
+        new = arrays['new'][start:stop]
+        new[:] = np.diff(values, axis=0, prepend=previous)
+        cumsum = arrays['cumsum']
+        cumsum[start + 1:stop + 1] = cumsum[start] + np.cumsum(new, axis=0)
+        arrays['rolling'][start:stop] = rolling_mean(cumsum, start, stop, self.window)
+        arrays['doubling'][start:stop] = doubling_time(arrays['totals'], start, stop, self.window)
+        self.days = np.concatenate([self.days, days])
+        self._views()
+        return len(days)
+
+    def series(self, region):
+        '''{'days': ..., kind: [day, metric] array for every kind in KINDS}.'''
+        column = self.columns.get(region)
+        if column is None:
+            raise KeyError('no region {!r}'.format(region))
+        series = {'days': self.days}
+        for kind in KINDS:
+            series[kind] = getattr(self, kind)[:, column]
+        return series
+
+    def ranking(self, kind='rolling', metric='confirmed', day=-1, n=10,
+                provinces=False):
+        '''
+        The n regions first by kind/metric on a day, as (region, value)
+        pairs: the highest, except for doubling where the fastest (lowest)
+        comes first. Regions without a value that day are left out.
+        '''
+        values = getattr(self, kind)[day, :, METRICS.index(metric)].astype(np.float64)
+        if kind == 'doubling':
+            values = -values
+        keep = ~np.isnan(values)
+        if not provinces:
+            keep &= np.array(['/' not in region for region in self.regions], bool)
+        candidates = np.flatnonzero(keep)
+        values = values[candidates]
+        if n < len(candidates):
+            top = np.argpartition(-values, n - 1)[:n]
+        else:
+            top = np.arange(len(candidates))
+        top = top[np.argsort(-values[top], kind='stable')]
+        sign = -1 if kind == 'doubling' else 1
+        return [(self.regions[candidates[i]], float(sign * values[i])) for i in top]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Metrics of the aggregated daily reports')
+    parser.add_argument('regions', nargs='*', help="e.g. US, China or 'US/New York'")
+    parser.add_argument('--last', type=int, default=7, help='days to show')
+    parser.add_argument('--top', type=int, default=10, help='regions in the ranking')
+    parser.add_argument('--by', choices=KINDS, default='rolling')
+    parser.add_argument('--metric', choices=METRICS, default='confirmed')
+    parser.add_argument('--provinces', action='store_true',
+                        help='rank provinces too')
+    parser.add_argument('--path', default=None, help='the store (data/covid19.db)')
+    args = parser.parse_args()
+
+    from store import Store, PATH
+    metrics = Metrics(Store(args.path or PATH).table())
+    if not len(metrics):
+        exit('No days stored yet in {}: run covid19_fetch.py first'.format(args.path or PATH))
+    for region in args.regions:
+        series = metrics.series(region)
+        print(region)
+        for i in range(max(0, len(metrics) - args.last), len(metrics)):
+            print('  {}  new={:>8}  7-day={:>10.1f}  doubling={:>6.1f} days'.format(
+                series['days'][i], series['new'][i, 0], series['rolling'][i, 0],
+                series['doubling'][i, 0]))
+    if not args.regions:
+        print('Top {} by {} {} on {}:'.format(args.top, args.by, args.metric, metrics.days[-1]))
+        for region, value in metrics.ranking(args.by, args.metric, n=args.top,
+                                             provinces=args.provinces):
+            print('  {:<30} {:>14.1f}'.format(region, value))
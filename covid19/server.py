@@ -0,0 +1,150 @@
+'''
+Web server for the dashboard (index.html), in place of getData.php:
+
+    python3 server.py --port 5000
+    http://localhost:5000/?region=Italy
+
+/data?region=US answers with one region's series, as columns:
+
+    {"region": "US", "days": ["2020-01-22", ...],
+     "confirmed": [1, ...], "deaths": [0, ...], "recovered": [0, ...]}
+
+The payloads are built from the store once, kept in memory already
+encoded and gzipped, and thrown away when the fetcher commits new days.
+Every payload has an ETag, so a browser that has the current one gets
+an empty 304.
+
+/query?region=US&region=Italy&from=2021-03-01&to=2021-03-07 answers with
+just those days (both included) for those regions, sliced out of the
+same in-memory table by binary search on the days:
+
+    {"days": ["2021-03-01", ...],
+     "regions": {"US": {"confirmed": [...], ...}, "Italy": {...}}}
+'''
+import argparse
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+from flask import Flask, Response, abort, request, send_from_directory
+
+from aggregate import METRICS
+from store import Store, PATH
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class Payloads:
+    '''Encoded /data bodies by region, rebuilt when the store changes.'''
+
+    def __init__(self, store):
+        self.store = store
+        self.lock = threading.Lock()
+        self.version = None
+        self.table = None
+        self.cache = {}
+
+    def _refresh(self):
+        version = self.store.version()
+        if version != self.version:
+            # One read of everything, then each region is a slice
+            self.table = self.store.table()
+            self.version = version
+            self.cache = {}
+
+    def current(self):
+        '''The RegionTable, read again if the store changed.'''
+        with self.lock:
+            self._refresh()
+            return self.table
+
+    def get(self, region):
+        '''(etag, body, gzipped body) for region; KeyError if unknown.'''
+        with self.lock:
+            self._refresh()
+            payload = self.cache.get(region)
+            if payload is None:
+                payload = self.cache[region] = self._encode(region)
+            return payload
+
+    def _encode(self, region):
+        series = self.table.series(region)
+        data = {'region': region,
+                'days': [str(day) for day in series['days']]}
+        for metric in METRICS:
+            data[metric] = series[metric].tolist()
+        body = json.dumps(data, separators=(',', ':')).encode()
+        etag = hashlib.sha1(body).hexdigest()[:16]
+        return etag, body, gzip.compress(body)
+
+
+app = Flask(__name__)
+
+
+@app.route('/')
+def index():
+    return send_from_directory(HERE, 'index.html')
+
+
+@app.route('/data')
+def data():
+    region = request.args.get('region', 'US')
+    try:
+        etag, body, gzipped = app.config['payloads'].get(region)
+    except KeyError:
+        abort(404)
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        # Not the same bytes, so not the same tag
+        etag, body = etag + '-gzip', gzipped
+        encoding = 'gzip'
+    else:
+        encoding = None
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    # Always check, the data changes whenever the fetcher runs
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@app.route('/query')
+def query():
+    regions = request.args.getlist('region') or ['US']
+    start, end = request.args.get('from'), request.args.get('to')
+    try:
+        for date in (start, end):
+            if date is not None:
+                datetime.date.fromisoformat(date)
+    except ValueError:
+        abort(400, 'dates are YYYY-MM-DD')
+    table = app.config['payloads'].current()
+    try:
+        result = table.query(regions, start, end)
+    except KeyError as e:
+        abort(404, e.args[0])
+    data = {'days': [str(day) for day in result[regions[0]]['days']], 'regions': {}}
+    for region, series in result.items():
+        data['regions'][region] = {metric: series[metric].tolist() for metric in METRICS}
+    response = Response(json.dumps(data, separators=(',', ':')),
+                        mimetype='application/json')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='COVID-19 dashboard server')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--db', default=os.path.join(HERE, PATH),
+                        help='the store written by covid19_fetch.py')
+    args = parser.parse_args()
+
+    app.config['payloads'] = Payloads(Store(args.db))
+    app.run(host='0.0.0.0', port=args.port, threaded=True)
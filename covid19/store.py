@@ -0,0 +1,185 @@
+'''
+SQLite store for the aggregated daily reports, data/covid19.db:
+
+    reports(day, source, regions)                   one row per day stored
+    totals(region, day, confirmed, deaths, recovered)
+
+Days are ISO dates (YYYY-MM-DD, so they sort), counts are integers, and
+totals is keyed by (region, day), so a region's series is one index
+range scan; there's a second index by day. A run only appends the days
+it fetched, in a single transaction: an interrupted run leaves the store
+as it was, never half a day.
+
+data.json, the dashboard's input, is exported from the store (written to
+a temporary file and renamed into place). The data.json written by the
+old fetch script can be migrated into the store; its days are marked as
+coming from 'data.json' since they only hold one region, and get
+replaced by the full reports whenever those can be fetched.
+
+    store = Store()
+    store.migrate_json('data/data.json', region='US')
+    store.append([('03-15-2020', aggregate(report))])
+    store.series('Italy')
+    store.query(['US', 'Italy'], '2021-03-01', '2021-03-07')
+    store.export_json('data/data.json', 'US')
+'''
+import datetime
+import json
+import os
+import sqlite3
+
+import numpy as np
+
+from aggregate import METRICS, RegionTable
+
+PATH = os.path.join('data', 'covid19.db')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS reports (
+    day TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    regions INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS totals (
+    region TEXT NOT NULL,
+    day TEXT NOT NULL,
+    confirmed INTEGER NOT NULL,
+    deaths INTEGER NOT NULL,
+    recovered INTEGER NOT NULL,
+    PRIMARY KEY (region, day)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS totals_day ON totals (day);
+'''
+
+
+def iso_day(date):
+    '''The API's MM-DD-YYYY -> YYYY-MM-DD.'''
+    return datetime.datetime.strptime(date, '%m-%d-%Y').date().isoformat()
+
+
+def api_day(day):
+    '''YYYY-MM-DD -> the API's MM-DD-YYYY.'''
+    return datetime.date.fromisoformat(day).strftime('%m-%d-%Y')
+
+
+class Store:
+    def __init__(self, path=PATH):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        # Readers (the web server) don't block the fetcher and vice versa
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def version(self):
+        '''Changes whenever another connection (the fetcher) commits.'''
+        return self.db.execute('PRAGMA data_version').fetchone()[0]
+
+    def days(self, source=None):
+        '''API dates stored (only those from 'source' if given).'''
+        if source is None:
+            rows = self.db.execute('SELECT day FROM reports')
+        else:
+            rows = self.db.execute('SELECT day FROM reports WHERE source = ?', (source,))
+        return {api_day(day) for day, in rows}
+
+    def append(self, days, source='api'):
+        '''
+        Store (API date, aggregate()) pairs, all in one transaction. Days
+        already stored are replaced (e.g. migrated ones).
+        '''
+        days = [(iso_day(date), totals) for date, totals in days]
+        with self.db:
+            self.db.executemany('DELETE FROM totals WHERE day = ?',
+                                [(day,) for day, totals in days])
+            self.db.executemany(
+                'INSERT OR REPLACE INTO reports (day, source, regions) VALUES (?, ?, ?)',
+                [(day, source, len(totals)) for day, totals in days])
+            self.db.executemany(
+                'INSERT INTO totals (region, day, confirmed, deaths, recovered) '
+                'VALUES (?, ?, ?, ?, ?)',
+                [(region, day) + tuple(counts)
+                 for day, totals in days for region, counts in totals.items()])
+        return len(days)
+
+    def regions(self):
+        return [region for region, in self.db.execute(
+            'SELECT DISTINCT region FROM totals ORDER BY region')]
+
+    def series(self, region):
+        '''{'days': datetime64 array, 'confirmed': ..., ...} for one region.'''
+        return self.query([region])[region]
+
+    def query(self, regions, start=None, end=None):
+        '''
+        {region: series} for the days from start to end (ISO dates, both
+        included), read straight off the (region, day) index.
+        '''
+        result = {}
+        for region in regions:
+            rows = self.db.execute(
+                'SELECT day, confirmed, deaths, recovered FROM totals '
+                'WHERE region = ? AND day BETWEEN ? AND ? ORDER BY day',
+                (region, start or '0000-00-00', end or '9999-99-99')).fetchall()
+            if not rows:
+                if self.db.execute('SELECT 1 FROM totals WHERE region = ? LIMIT 1',
+                                   (region,)).fetchone() is None:
+                    raise KeyError('no region {!r}'.format(region))
+            series = {'days': np.array([row[0] for row in rows], 'datetime64[D]')}
+            for i, metric in enumerate(METRICS, 1):
+                series[metric] = np.array([row[i] for row in rows], np.int64)
+            result[region] = series
+        return result
+
+    def table(self, provinces=True):
+        '''Everything as a RegionTable (without provinces if asked).'''
+        days = [day for day, in self.db.execute('SELECT day FROM reports ORDER BY day')]
+        regions = [region for region in self.regions()
+                   if provinces or '/' not in region]
+        rows = {day: i for i, day in enumerate(days)}
+        columns = {region: i for i, region in enumerate(regions)}
+        values = np.zeros((len(days), len(regions), len(METRICS)), np.int64)
+        for region, day, *counts in self.db.execute(
+                'SELECT region, day, confirmed, deaths, recovered FROM totals'):
+            column = columns.get(region)
+            if column is not None:
+                values[rows[day], column] = counts
+        return RegionTable(np.array(days, 'datetime64[D]'), regions, values,
+                           provinces)
+
+    def migrate_json(self, path, region):
+        '''
+        Import the old data.json (one region's totals as strings) for the
+        days the store doesn't have. Returns the number of days imported.
+        '''
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        have = self.days()
+        days = []
+        for date, entry in data.items():
+            if date in have:
+                continue
+            try:
+                counts = [int(entry[metric]) for metric in METRICS]
+            except (KeyError, TypeError, ValueError):
+                continue
+            days.append((date, {region: counts}))
+        return self.append(days, source='data.json')
+
+    def export_json(self, path, region):
+        '''Write region's series as the dashboard's data.json, atomically.'''
+        series = self.series(region)
+        data = {}
+        for i, day in enumerate(series['days'].tolist()):
+            data[day.strftime('%m-%d-%Y')] = {
+                metric: int(series[metric][i]) for metric in METRICS}
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            # Days in order: the dashboard takes the last one as the latest
+            json.dump(data, f, indent=4, separators=(',', ': '))
+        os.replace(tmp, path)
@@ -0,0 +1,107 @@
+'''
+Local stand-in for the COVID-19 API, to develop and time the fetcher
+without hammering (or needing) the real one:
+
+    python3 stub_server.py --port 8000 --delay 0.05 --fail-rate 0.1
+    python3 covid19_fetch.py --url http://localhost:8000/api/daily
+
+Serves /api/daily/<MM-DD-YYYY> in the same format as the real API, made
+up but deterministic: the same date always gives the same report. Days
+from 01-22-2020 to yesterday exist, anything else is a 404. Connections
+are kept alive (HTTP/1.1), --delay simulates latency and --fail-rate
+makes that fraction of requests fail with a 503, to exercise the
+retries.
+'''
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import datetime
+import json
+import random
+import time
+
+FIRST_DAY = datetime.date(2020, 1, 22)
+
+# (countryRegion, provinceStates) in the made up reports
+REGIONS = [('US', ['New York', 'California', 'Washington', 'Texas', 'Florida']),
+           ('China', ['Hubei', 'Guangdong', 'Henan', 'Zhejiang']),
+           ('Italy', ['']),
+           ('Spain', ['']),
+           ('Germany', ['']),
+           ('Canada', ['Ontario', 'Quebec', 'British Columbia']),
+           ('Australia', ['New South Wales', 'Victoria']),
+           ('Brazil', [''])]
+
+
+def report(day):
+    '''The made up report for a date, as the API would return it.'''
+    n = (day - FIRST_DAY).days + 1
+    rng = random.Random(day.toordinal())
+    rows = []
+    for r, (country, provinces) in enumerate(REGIONS):
+        for p, province in enumerate(provinces):
+            # Slow exponential growth, different for every place
+            base = (r + 1) * (p + 2) * 1.04 ** min(n, 150) * (1 + n / 50)
+            confirmed = int(base * 10)
+            deaths = int(base * 0.3)
+            recovered = int(base * 4)
+            rows.append({
+                'provinceState': province,
+                'countryRegion': country,
+                'lastUpdate': day.isoformat() + 'T23:59:00',
+                'confirmed': str(confirmed),
+                'deaths': str(deaths),
+                # Early reports had gaps, the fetcher must cope with them
+                'recovered': '' if rng.random() < 0.05 else str(recovered),
+            })
+    return rows
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        prefix = '/api/daily/'
+        day = None
+        if self.path.startswith(prefix):
+            try:
+                day = datetime.datetime.strptime(self.path[len(prefix):], '%m-%d-%Y').date()
+            except ValueError:
+                pass
+        if day is None or not FIRST_DAY <= day < datetime.date.today():
+            self.reply(404, b'{"error":"not found"}')
+            return
+        time.sleep(self.server.delay)
+        if random.random() < self.server.fail_rate:
+            self.reply(503, b'{"error":"try again"}')
+            return
+        self.reply(200, json.dumps(report(day)).encode())
+
+    def reply(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stub COVID-19 daily report API')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--delay', type=float, default=0.0,
+                        help='seconds to wait before every response')
+    parser.add_argument('--fail-rate', type=float, default=0.0,
+                        help='fraction of requests answered with a 503')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('', args.port), Handler)
+    server.daemon_threads = True
+    server.delay = args.delay
+    server.fail_rate = args.fail_rate
+    server.verbose = args.verbose
+    print('serving /api/daily/<MM-DD-YYYY> on port {}'.format(args.port))
+    server.serve_forever()
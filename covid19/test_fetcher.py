@@ -0,0 +1,77 @@
+import datetime
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import stub_server
+from fetcher import DailyFetcher, FetchError, dates
+
+START = datetime.date(2020, 3, 1)
+DAYS = list(dates(START, START + datetime.timedelta(days=40)))
+
+
+@pytest.fixture
+def stub():
+    '''The stub API on a free port; set fail_rate on it to make requests fail.'''
+    server = ThreadingHTTPServer(('127.0.0.1', 0), stub_server.Handler)
+    server.daemon_threads = True
+    server.delay = 0.0
+    server.fail_rate = 0.0
+    server.verbose = False
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def fetcher(server, cache_dir, **kwargs):
+    url = 'http://127.0.0.1:{}/api/daily'.format(server.server_address[1])
+    kwargs.setdefault('backoff', 0.001)
+    return DailyFetcher(url=url, cache_dir=str(cache_dir), workers=4, **kwargs)
+
+
+def expected(date):
+    return stub_server.report(datetime.datetime.strptime(date, '%m-%d-%Y').date())
+
+
+def test_retries_failed_requests(stub, tmp_path):
+    stub.fail_rate = 0.3
+    f = fetcher(stub, tmp_path, retries=10)
+    reports = dict(f.fetch_all(DAYS))
+    assert reports == {date: expected(date) for date in DAYS}
+    assert f.stats['fetched'] == len(DAYS)
+    # 40 days with 30% of the requests failing: some had to be retried
+    assert f.stats['retries'] > 0
+
+
+def test_cached_days_are_not_fetched_again(stub, tmp_path):
+    first = fetcher(stub, tmp_path)
+    list(first.fetch_all(DAYS))
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(d + '.json' for d in DAYS)
+    # Every request would fail now, but none is made
+    stub.fail_rate = 1.0
+    second = fetcher(stub, tmp_path, retries=0)
+    reports = dict(second.fetch_all(DAYS))
+    assert reports == {date: expected(date) for date in DAYS}
+    assert second.stats == {'cached': len(DAYS), 'fetched': 0, 'retries': 0, 'missing': 0}
+
+
+def test_gives_up_after_the_retries(stub, tmp_path):
+    stub.fail_rate = 1.0
+    f = fetcher(stub, tmp_path, retries=2)
+    with pytest.raises(FetchError, match='503'):
+        f.fetch(DAYS[0])
+    assert f.stats['retries'] == 2
+    # Nothing half-written in the cache
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_unpublished_days(stub, tmp_path):
+    tomorrow = (datetime.date.today() + datetime.timedelta(days=1)).strftime('%m-%d-%Y')
+    f = fetcher(stub, tmp_path)
+    assert list(f.fetch_all([DAYS[0], tomorrow])) == [(DAYS[0], expected(DAYS[0])),
+                                                      (tomorrow, None)]
+    assert f.stats['missing'] == 1
+    assert f.stats['retries'] == 0
@@ -0,0 +1,57 @@
+import numpy as np
+
+from aggregate import METRICS, RegionTable
+from metrics import KINDS, WINDOW, Metrics
+
+
+def table(days, regions, seed=0):
+    '''Cumulative totals that only grow, for days (from 2020-01-22) and regions.'''
+    rng = np.random.default_rng(seed)
+    dates = np.datetime64('2020-01-22') + np.arange(days)
+    values = np.cumsum(rng.integers(0, 50, (days, len(regions), len(METRICS))), axis=0)
+    return RegionTable(dates, regions, values)
+
+
+def head(full, days, regions):
+    '''The first days of full, reporting only regions.'''
+    columns = [full.regions.index(region) for region in regions]
+    return RegionTable(full.days[:days], regions, full.values[:days][:, columns])
+
+
+def assert_same(incremental, full):
+    assert incremental.regions == full.regions
+    np.testing.assert_array_equal(incremental.days, full.days)
+    for kind in KINDS:
+        np.testing.assert_array_equal(getattr(incremental, kind), getattr(full, kind),
+                                      err_msg=kind)
+
+
+def test_update_matches_full_recompute():
+    full = table(40, ['US', 'Italy'])
+    metrics = Metrics(head(full, 20, ['US', 'Italy']))
+    for days in (21, 30, 40):
+        metrics.update(head(full, days, ['US', 'Italy']))
+    assert_same(metrics, Metrics(full))
+
+
+def test_regions_appearing_late():
+    full = table(40, ['US', 'Italy', 'Spain'])
+    # Before Italy and Spain were reported, their totals were zero
+    full.values[:3, 1] = 0
+    full.values[:25, 2] = 0
+    metrics = Metrics(head(full, 3, ['US']))
+    metrics.update(head(full, 25, ['US', 'Italy']))
+    metrics.update(full)
+    assert_same(metrics, Metrics(full))
+    # Too early for a 7-day mean, for every region
+    assert np.isnan(metrics.rolling[:WINDOW - 1]).all()
+    assert not np.isnan(metrics.rolling[WINDOW - 1:]).any()
+
+
+def test_gaps_are_filled_with_the_day_before():
+    full = table(20, ['US'])
+    keep = np.array([i not in (5, 6, 12) for i in range(20)])
+    metrics = Metrics(RegionTable(full.days[keep], ['US'], full.values[keep]))
+    assert len(metrics) == 20
+    np.testing.assert_array_equal(metrics.totals[5], full.values[4])
+    np.testing.assert_array_equal(metrics.new[5:7], 0)
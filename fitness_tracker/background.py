@@ -0,0 +1,49 @@
+'''
+Running-average background model. The average is kept in float32 and
+updated in place with cv2.accumulateWeighted, so updating it costs one
+pass over the image and never allocates.
+'''
+import cv2
+import numpy as np
+
+# Fraction of the current frame blended into the background per update
+LEARNING_RATE = 0.02
+# Frames averaged (with equal weight) before the model is usable
+WARMUP = 30
+
+
+class BackgroundModel:
+    def __init__(self, shape, learning_rate=LEARNING_RATE, warmup=WARMUP):
+        self.shape = shape
+        self.learning_rate = learning_rate
+        self.warmup = warmup
+        self.frames = 0
+        self.average = np.zeros(shape, np.float32)
+        self.background = np.zeros(shape, np.uint8)
+        self.update_mask = np.empty(shape, np.uint8)
+
+    @property
+    def ready(self):
+        return self.frames >= self.warmup
+
+    def update(self, image, foreground=None):
+        '''
+        Blend image into the background. Pixels set in the foreground mask
+        are left alone, so a glove held still isn't absorbed into the
+        background.
+        '''
+        if not self.ready:
+            # Plain cumulative mean while warming up
+            alpha = 1.0 / (self.frames + 1)
+        else:
+            alpha = self.learning_rate
+        mask = None
+        if foreground is not None:
+            mask = cv2.bitwise_not(foreground, dst=self.update_mask)
+        cv2.accumulateWeighted(image, self.average, alpha, mask=mask)
+        cv2.convertScaleAbs(self.average, dst=self.background)
+        self.frames += 1
+
+    def subtract(self, image, dst):
+        '''What is brighter than the background (saturating at 0).'''
+        return cv2.subtract(image, self.background, dst=dst)
@@ -0,0 +1,504 @@
+'''
+Benchmarks for the fitness tracker that run without a camera, e.g.
+
+    python3 bench.py pipeline --frames 600 --fps 30
+    python3 bench.py replay session1
+    python3 bench.py alloc --cv-threads 1
+    python3 bench.py modes session1
+    python3 bench.py background
+    python3 bench.py scales session1 --mode color
+    python3 bench.py blobs
+    python3 bench.py telemetry
+    python3 bench.py parallel session1 --workers 1 2 3 4
+    python3 bench.py colormap session1
+    python3 bench.py tracking --gloves 2
+
+Commands that take a recording fall back to a synthetic one (written to a
+temporary directory) when no path is given.
+'''
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from background import BackgroundModel, LEARNING_RATE, WARMUP
+from blobs import BlobExtractor
+from depth_view import DepthColorizer, SideBySide
+from frame_source import SyntheticSource, ReplaySource, record
+from parallel import FrameWorkers, preprocessor
+from punch_detector import PunchDetector, ROI, MODES, MAX_LEVELS, \
+    AREA_THRESH, FOREGROUND_THRESH
+from stages import Pipeline
+from telemetry import Profiler, profiler
+from tracker import Tracker
+
+
+def bench_pipeline(args):
+    # Serial baseline: capture, process and "display" in one loop
+    source = SyntheticSource(fps=args.fps, count=args.frames)
+    detector = PunchDetector()
+    t0 = time.monotonic()
+    for frame in source:
+        detector.process(frame)
+        time.sleep(args.display_ms / 1e3)
+    serial = time.monotonic() - t0
+    print('serial:    {} frames in {:.2f}s ({:.1f} fps), {} punches'.format(
+        args.frames, serial, args.frames / serial, detector.punch_count))
+
+    # Staged pipeline with the same simulated display cost
+    source = SyntheticSource(fps=args.fps, count=args.frames)
+    detector = PunchDetector()
+    pipeline = Pipeline(source, detector.process,
+                        lambda result: time.sleep(args.display_ms / 1e3),
+                        buffer_size=args.buffer, report_every=0)
+    t0 = time.monotonic()
+    shown = pipeline.run()
+    staged = time.monotonic() - t0
+    print('pipelined: {} frames shown in {:.2f}s ({:.1f} fps), {} punches'.format(
+        shown, staged, shown / staged, detector.punch_count))
+    print(pipeline.report())
+
+
+def recording(args):
+    '''Path of the recording to benchmark on, recording one if needed.'''
+    if args.recording:
+        return args.recording
+    path = os.path.join(tempfile.mkdtemp(prefix='bench_'), 'synthetic')
+    record(SyntheticSource(fps=0), path, args.frames)
+    return path
+
+
+def bench_replay(args):
+    path = recording(args)
+    source = ReplaySource(path)
+    t0 = time.monotonic()
+    n = sum(1 for frame in source)
+    elapsed = time.monotonic() - t0
+    print('replay:   {} frames in {:.3f}s ({:.0f} fps)'.format(n, elapsed, n / elapsed))
+
+    detector = PunchDetector(outline=False)
+    t0 = time.monotonic()
+    for frame in ReplaySource(path):
+        detector.process(frame)
+    elapsed = time.monotonic() - t0
+    print('detector: {} frames in {:.3f}s ({:.0f} fps), {} punches'.format(
+        n, elapsed, n / elapsed, detector.punch_count))
+
+
+class LegacyDetector:
+    '''
+    The same work as PunchDetector (color mode, background model, largest
+    blobs, hull and tracking), but the original way: every OpenCV step
+    allocates a new image.
+    '''
+    def __init__(self, learning_rate=LEARNING_RATE, warmup=WARMUP):
+        self.learning_rate = learning_rate
+        self.warmup = warmup
+        self.frames = 0
+        self.average = None
+        self.blobs = BlobExtractor()
+        self.tracker = Tracker()
+
+    def update_background(self, blur, foreground=None):
+        alpha = 1.0 / (self.frames + 1) if self.frames < self.warmup else self.learning_rate
+        if self.average is None:
+            self.average = np.zeros(blur.shape, np.float32)
+        blended = cv2.addWeighted(blur.astype(np.float32), alpha,
+                                  self.average, 1.0 - alpha, 0)
+        if foreground is not None:
+            blended = np.where(cv2.bitwise_not(foreground) > 0, blended, self.average)
+        self.average = blended
+        self.frames += 1
+        return cv2.convertScaleAbs(self.average)
+
+    def process(self, frame):
+        color_image = frame.color[ROI]
+        gray = cv2.cvtColor(color_image, cv2.COLOR_BGR2GRAY)
+        gaussian_blur = cv2.GaussianBlur(gray, (21, 21), 0)
+        blur = cv2.blur(gaussian_blur, (5, 5))
+        if self.frames < self.warmup:
+            self.update_background(blur)
+            return
+        background = cv2.convertScaleAbs(self.average)
+        foreground = cv2.subtract(blur, background)
+        ret, thresh = cv2.threshold(foreground, FOREGROUND_THRESH, 255, cv2.THRESH_BINARY)
+        thresh = cv2.dilate(thresh, None, iterations=2)
+        self.update_background(blur, foreground=thresh)
+        blobs = [blob for blob in self.blobs.largest_n(thresh, self.tracker.max_tracks)
+                 if blob.area > AREA_THRESH]
+        if blobs:
+            contour, hull = self.blobs.outline(blobs[0])
+        self.tracker.update(blobs)
+        # The image to display, a new one every frame
+        cv2.cvtColor(thresh, cv2.COLOR_GRAY2BGR)
+
+
+def per_frame_cost(process, frames):
+    '''(mean latency in ms, mean bytes allocated at peak per frame)'''
+    # Warm up (buffer pools, background model) before measuring
+    for frame in frames[:40]:
+        process(frame)
+    frames = frames[40:]
+    t0 = time.perf_counter()
+    for frame in frames:
+        process(frame)
+    latency = (time.perf_counter() - t0) / len(frames)
+    # Allocations are measured in a second, traced pass so tracemalloc
+    # doesn't skew the timings
+    tracemalloc.start()
+    peak = 0
+    for frame in frames:
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        process(frame)
+        peak += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return latency * 1e3, peak / len(frames)
+
+
+def bench_alloc(args):
+    if args.cv_threads:
+        # e.g. 1 to approximate a single Pi core
+        cv2.setNumThreads(args.cv_threads)
+    frames = list(ReplaySource(recording(args)))
+    legacy = LegacyDetector()
+    detector = PunchDetector()
+    img_out = None
+
+    def pooled(frame):
+        nonlocal img_out
+        detection = detector.process(frame)
+        if detection.mask is not None:
+            if img_out is None:
+                img_out = cv2.cvtColor(detection.mask, cv2.COLOR_GRAY2BGR)
+            cv2.cvtColor(detection.mask, cv2.COLOR_GRAY2BGR, dst=img_out)
+
+    # Same stages on both sides, and no profiler sections on either
+    profiler.enabled = False
+    for name, process in (('allocating', legacy.process), ('pooled', pooled)):
+        latency, allocated = per_frame_cost(process, frames)
+        print('{:>10}: {:6.2f}ms/frame, {:8.1f} KiB allocated/frame'.format(
+            name, latency, allocated / 1024))
+    profiler.enabled = True
+
+
+def bench_modes(args):
+    if args.cv_threads:
+        cv2.setNumThreads(args.cv_threads)
+    frames = list(ReplaySource(recording(args)))
+    for mode in MODES:
+        detector = PunchDetector(mode=mode, outline=False)
+        t0 = time.perf_counter()
+        for frame in frames:
+            detector.process(frame)
+        elapsed = time.perf_counter() - t0
+        print('{:>6}: {:6.2f}ms/frame, {} punches'.format(
+            mode, elapsed / len(frames) * 1e3, detector.punch_count))
+
+
+def bench_background(args):
+    if args.cv_threads:
+        cv2.setNumThreads(args.cv_threads)
+    rng = np.random.default_rng(0)
+    roi_shape = tuple(s.stop - s.start for s in ROI)
+    for name, shape in (('640x480', (480, 640)), ('ROI', roi_shape)):
+        images = rng.integers(0, 256, (8,) + shape, dtype=np.uint8)
+        foreground = np.zeros(shape, np.uint8)
+        foreground[shape[0] // 4:shape[0] // 2, shape[1] // 4:shape[1] // 2] = 255
+        diff = np.empty(shape, np.uint8)
+        model = BackgroundModel(shape, warmup=0)
+        t0 = time.perf_counter()
+        for i in range(args.frames):
+            image = images[i % len(images)]
+            model.subtract(image, dst=diff)
+            model.update(image, foreground=foreground)
+        elapsed = (time.perf_counter() - t0) / args.frames
+        print('{:>8}: {:6.3f}ms/frame (subtract + masked update)'.format(
+            name, elapsed * 1e3))
+
+
+def run_detector(detector, frames):
+    '''(seconds, per-frame detected flags, frame indices of punches)'''
+    detected = []
+    punches = []
+    t0 = time.perf_counter()
+    for frame in frames:
+        detection = detector.process(frame)
+        detected.append(detection.blob is not None)
+        if detection.punch:
+            punches.append(frame.index)
+    return time.perf_counter() - t0, detected, punches
+
+
+def bench_scales(args):
+    if args.cv_threads:
+        cv2.setNumThreads(args.cv_threads)
+    frames = list(ReplaySource(recording(args)))
+    print('{} mode, accuracy relative to full resolution ({} frames)'.format(
+        args.mode, len(frames)))
+    reference = None
+    for levels in range(MAX_LEVELS + 1):
+        detector = PunchDetector(mode=args.mode, levels=levels, outline=False)
+        elapsed, detected, punches = run_detector(detector, frames)
+        if reference is None:
+            reference = detected, punches
+        agreement = np.mean(np.equal(detected, reference[0]))
+        # A punch matches if the reference has one within 2 frames
+        matched = sum(any(abs(p - q) <= 2 for q in reference[1]) for p in punches)
+        print('1/{:<2} {:7.0f} fps  {:5.1%} frames agree  '
+              '{:3d} punches ({} matched, {} in reference)'.format(
+                  2 ** levels, len(frames) / elapsed, agreement,
+                  len(punches), matched, len(reference[1])))
+
+
+def bench_blobs(args):
+    if args.cv_threads:
+        cv2.setNumThreads(args.cv_threads)
+    detector = PunchDetector(outline=False)
+    masks = []
+    for frame in ReplaySource(recording(args)):
+        detection = detector.process(frame)
+        if detection.mask is not None:
+            masks.append(detection.mask.copy())
+    if args.speckle:
+        # Real masks are rarely this clean: add specks and pinholes
+        rng = np.random.default_rng(0)
+        for mask in masks:
+            flip = rng.random(mask.shape) < args.speckle
+            mask[flip] = 255 - mask[flip]
+
+    def contours_tree(mask):
+        contours, hierarchy = cv2.findContours(mask, cv2.RETR_TREE,
+                                               cv2.CHAIN_APPROX_SIMPLE)
+        if contours:
+            contour = max(contours, key=lambda x: cv2.contourArea(x))
+            if cv2.contourArea(contour) > 1500:
+                cv2.convexHull(contour, False)
+
+    def extract_with(method, outline):
+        extractor = BlobExtractor(method)
+
+        def extract(mask):
+            blob = extractor.largest(mask)
+            if outline and blob is not None and blob.area > 1500:
+                extractor.outline(blob)
+        return extract
+
+    for name, extract in (('findContours(RETR_TREE) + areas + hull', contours_tree),
+                          ('contours', extract_with('contours', False)),
+                          ('contours + hull', extract_with('contours', True)),
+                          ('components', extract_with('components', False)),
+                          ('components + outline', extract_with('components', True))):
+        t0 = time.perf_counter()
+        for mask in masks:
+            extract(mask)
+        elapsed = (time.perf_counter() - t0) / len(masks)
+        print('{:>40}: {:6.1f}us/frame'.format(name, elapsed * 1e6))
+
+
+def bench_telemetry(args):
+    # Cost of an empty section, enabled and disabled
+    for enabled in (True, False):
+        profiler = Profiler(enabled=enabled)
+        t0 = time.perf_counter()
+        for i in range(args.iterations):
+            with profiler.section('empty'):
+                pass
+        elapsed = (time.perf_counter() - t0) / args.iterations
+        print('section ({}): {:.2f}us'.format(
+            'enabled' if enabled else 'disabled', elapsed * 1e6))
+    profiler = Profiler()
+    profiler.start_trace()
+    t0 = time.perf_counter()
+    for i in range(args.iterations):
+        with profiler.section('empty'):
+            pass
+    elapsed = (time.perf_counter() - t0) / args.iterations
+    print('section (tracing): {:.2f}us'.format(elapsed * 1e6))
+
+
+def bench_parallel(args):
+    frames = list(ReplaySource(recording(args)))
+    kwargs = dict(mode=args.mode, outline=False)
+    print('{} mode, {} frames, {} CPUs'.format(args.mode, len(frames), os.cpu_count()))
+    # Everything in this process
+    detector = PunchDetector(**kwargs)
+    elapsed, detected, punches = run_detector(detector, frames)
+    print('{:>10}: {:7.0f} fps  {} punches'.format(
+        'serial', len(frames) / elapsed, len(punches)))
+    # Preprocessing in the workers, in-order segmentation here
+    for workers in args.workers:
+        pool = FrameWorkers(preprocessor, (kwargs,), workers=workers)
+        try:
+            detector = PunchDetector(**kwargs)
+            count = 0
+            t0 = time.perf_counter()
+            for frame, image in pool.map(frames):
+                detection = detector.detect(frame, detector.segment(frame, image))
+                count += int(detection.punch)
+            elapsed = time.perf_counter() - t0
+        finally:
+            pool.close()
+        print('{:>2} workers: {:7.0f} fps  {} punches'.format(
+            workers, len(frames) / elapsed, count))
+
+
+def bench_colormap(args):
+    if args.cv_threads:
+        cv2.setNumThreads(args.cv_threads)
+    frames = list(ReplaySource(recording(args)))
+
+    def legacy(frame):
+        depth_colormap = cv2.applyColorMap(
+            cv2.convertScaleAbs(frame.depth, alpha=0.03), cv2.COLORMAP_JET)
+        return np.hstack((frame.color, depth_colormap))
+
+    view = SideBySide()
+
+    def canvas(frame):
+        return view.compose(frame.color, frame.depth)
+
+    # The same two OpenCV calls, writing into a canvas
+    h, w = frames[0].depth.shape
+    gray = np.empty((h, w), np.uint8)
+    opencv_canvas = np.empty((h, 2 * w, 3), np.uint8)
+
+    def opencv(frame):
+        np.copyto(opencv_canvas[:, :w], frame.color)
+        cv2.convertScaleAbs(frame.depth, alpha=0.03, dst=gray)
+        cv2.applyColorMap(gray, cv2.COLORMAP_JET, dst=opencv_canvas[:, w:])
+        return opencv_canvas
+
+    t0 = time.perf_counter()
+    DepthColorizer()
+    print('lookup table built in {:.1f}ms'.format((time.perf_counter() - t0) * 1e3))
+    assert all(np.array_equal(legacy(frame), canvas(frame)) and
+               np.array_equal(legacy(frame), opencv(frame)) for frame in frames[:10])
+    for name, process in (('hstack', legacy), ('opencv + canvas', opencv),
+                          ('lut + canvas', canvas)):
+        latency, allocated = per_frame_cost(process, frames)
+        print('{:>16}: {:6.2f}ms/frame, {:8.1f} KiB allocated/frame'.format(
+            name, latency, allocated / 1024))
+
+
+def bench_tracking(args):
+    source = SyntheticSource(fps=0, count=args.frames, gloves=args.gloves)
+    frames = list(source)
+    # Every time a glove comes into view
+    expected = sum(1 for glove in range(args.gloves) for i in range(len(frames))
+                   if source.punching(i, glove) and
+                   (i == 0 or not source.punching(i - 1, glove)))
+    print('{} mode, {} frames, {} gloves, ~{} punches expected'.format(
+        args.mode, len(frames), args.gloves, expected))
+    for max_tracks in range(1, args.gloves + 2):
+        detector = PunchDetector(mode=args.mode, outline=False, max_tracks=max_tracks)
+        ids = set()
+        t_track = 0.0
+        for frame in frames:
+            mask = detector.segment(frame, detector.preprocess(frame))
+            t0 = time.perf_counter()
+            detection = detector.detect(frame, mask)
+            t_track += time.perf_counter() - t0
+            ids.update(track.id for track in detection.tracks)
+        counts = ', '.join('#{}: {}'.format(track.id, track.punch_count)
+                           for track in detector.tracker.tracks)
+        print('max_tracks={}: {:3d} punches ({}), {} IDs used, '
+              'blobs + tracking {:.0f}us/frame'.format(
+                  max_tracks, detector.punch_count, counts, len(ids),
+                  t_track / len(frames) * 1e6))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='bench', required=True)
+
+    p = sub.add_parser('pipeline', help='serial loop vs. staged pipeline')
+    p.add_argument('--frames', type=int, default=300)
+    p.add_argument('--fps', type=float, default=30,
+                   help='synthetic camera rate (0 = as fast as possible)')
+    p.add_argument('--display-ms', type=float, default=10,
+                   help='simulated cost of drawing/imshow per frame')
+    p.add_argument('--buffer', type=int, default=2)
+    p.set_defaults(func=bench_pipeline)
+
+    p = sub.add_parser('replay', help='raw replay rate and offline detector rate')
+    p.add_argument('recording', nargs='?')
+    p.add_argument('--frames', type=int, default=300,
+                   help='length of the synthetic recording')
+    p.set_defaults(func=bench_replay)
+
+    p = sub.add_parser('alloc', help='per-frame allocations and latency, '
+                       'allocating chain vs. buffer pool')
+    p.add_argument('recording', nargs='?')
+    p.add_argument('--frames', type=int, default=300,
+                   help='length of the synthetic recording')
+    p.add_argument('--cv-threads', type=int, default=0,
+                   help='limit OpenCV worker threads (0 = OpenCV default)')
+    p.set_defaults(func=bench_alloc)
+
+    p = sub.add_parser('modes', help='color vs. depth segmentation cost')
+    p.add_argument('recording', nargs='?')
+    p.add_argument('--frames', type=int, default=300,
+                   help='length of the synthetic recording')
+    p.add_argument('--cv-threads', type=int, default=0,
+                   help='limit OpenCV worker threads (0 = OpenCV default)')
+    p.set_defaults(func=bench_modes)
+
+    p = sub.add_parser('background', help='background model cost per frame')
+    p.add_argument('--frames', type=int, default=1000)
+    p.add_argument('--cv-threads', type=int, default=0,
+                   help='limit OpenCV worker threads (0 = OpenCV default)')
+    p.set_defaults(func=bench_background)
+
+    p = sub.add_parser('scales', help='fps and accuracy per pyramid level')
+    p.add_argument('recording', nargs='?')
+    p.add_argument('--frames', type=int, default=300,
+                   help='length of the synthetic recording')
+    p.add_argument('--mode', choices=MODES, default='color')
+    p.add_argument('--cv-threads', type=int, default=0,
+                   help='limit OpenCV worker threads (0 = OpenCV default)')
+    p.set_defaults(func=bench_scales)
+
+    p = sub.add_parser('blobs', help='largest-blob extraction cost')
+    p.add_argument('recording', nargs='?')
+    p.add_argument('--frames', type=int, default=300,
+                   help='length of the synthetic recording')
+    p.add_argument('--cv-threads', type=int, default=0,
+                   help='limit OpenCV worker threads (0 = OpenCV default)')
+    p.add_argument('--speckle', type=float, default=0.0,
+                   help='fraction of mask pixels to flip, simulating noise')
+    p.set_defaults(func=bench_blobs)
+
+    p = sub.add_parser('telemetry', help='overhead of a profiler section')
+    p.add_argument('--iterations', type=int, default=200000)
+    p.set_defaults(func=bench_telemetry)
+
+    p = sub.add_parser('parallel', help='throughput vs. number of worker processes')
+    p.add_argument('recording', nargs='?')
+    p.add_argument('--frames', type=int, default=300,
+                   help='length of the synthetic recording')
+    p.add_argument('--mode', choices=MODES, default='color')
+    p.add_argument('--workers', type=int, nargs='+', default=[1, 2, 3, 4])
+    p.set_defaults(func=bench_parallel)
+
+    p = sub.add_parser('colormap', help='viewer depth colormap and compositing')
+    p.add_argument('recording', nargs='?')
+    p.add_argument('--frames', type=int, default=300,
+                   help='length of the synthetic recording')
+    p.add_argument('--cv-threads', type=int, default=0,
+                   help='limit OpenCV worker threads (0 = OpenCV default)')
+    p.set_defaults(func=bench_colormap)
+
+    p = sub.add_parser('tracking', help='punch counts with several gloves in view')
+    p.add_argument('--frames', type=int, default=300)
+    p.add_argument('--gloves', type=int, default=2)
+    p.add_argument('--mode', choices=MODES, default='depth')
+    p.set_defaults(func=bench_tracking)
+
+    args = parser.parse_args()
+    args.func(args)
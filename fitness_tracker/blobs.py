@@ -0,0 +1,100 @@
+'''
+Largest-blob extraction for binary masks. Area, bounding box and centroid
+of the largest blob (or the n largest) come out of a single pass, and the
+convex hull is only computed when somebody is going to draw it.
+
+Two methods are available:
+    'contours'   - outer contours only (RETR_EXTERNAL: no hierarchy, no
+                   hole contours), with each contour's area computed once
+    'components' - cv2.connectedComponentsWithStats, which labels every
+                   pixel; its cost grows with the mask size rather than
+                   with the number of blobs, so it's slower on the mostly
+                   empty masks the detector produces but wins on noisy,
+                   speckled masks with hundreds of tiny blobs
+'''
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+METHODS = ('contours', 'components')
+
+# bbox is (x, y, width, height); all values are in mask pixels. contour is
+# None for the 'components' method until outline() is called.
+Blob = namedtuple('Blob', ['area', 'bbox', 'centroid', 'contour', 'label'])
+
+
+def _top(areas, n):
+    '''Indices of the n largest areas, largest first.'''
+    if len(areas) > n:
+        # Partial sort: linear in the number of blobs
+        top = np.argpartition(areas, len(areas) - n)[-n:]
+    else:
+        top = np.arange(len(areas))
+    return top[np.argsort(-areas[top], kind='stable')]
+
+
+class BlobExtractor:
+    def __init__(self, method='contours'):
+        if method not in METHODS:
+            raise ValueError('method must be one of {}'.format(METHODS))
+        self.method = method
+        self.labels = None
+
+    def largest(self, mask):
+        '''The largest blob in mask, or None if the mask is empty.'''
+        blobs = self.largest_n(mask, 1)
+        return blobs[0] if blobs else None
+
+    def largest_n(self, mask, n):
+        '''The n largest blobs in mask, largest first.'''
+        if self.method == 'components':
+            return self._largest_components(mask, n)
+        contours, hierarchy = cv2.findContours(mask, cv2.RETR_EXTERNAL,
+                                               cv2.CHAIN_APPROX_SIMPLE)
+        if not contours:
+            return []
+        # One contourArea() call per contour; moments only for the winners
+        areas = np.array([cv2.contourArea(contour) for contour in contours])
+        blobs = []
+        for i in _top(areas, n):
+            contour = contours[i]
+            m = cv2.moments(contour)
+            if m['m00']:
+                centroid = (m['m10'] / m['m00'], m['m01'] / m['m00'])
+            else:
+                # Degenerate (line-like) contour
+                centroid = tuple(float(v) for v in contour[:, 0].mean(axis=0))
+            blobs.append(Blob(float(areas[i]), cv2.boundingRect(contour),
+                              centroid, contour, None))
+        return blobs
+
+    def _largest_components(self, mask, n):
+        if self.labels is None or self.labels.shape != mask.shape:
+            self.labels = np.empty(mask.shape, np.int32)
+        count, labels, stats, centroids = cv2.connectedComponentsWithStats(
+            mask, labels=self.labels, connectivity=8)
+        # Label 0 is the background
+        blobs = []
+        for i in _top(stats[1:, cv2.CC_STAT_AREA], n):
+            label = int(i) + 1
+            x, y, w, h, area = stats[label]
+            blobs.append(Blob(float(area), (int(x), int(y), int(w), int(h)),
+                              (float(centroids[label][0]), float(centroids[label][1])),
+                              None, label))
+        return blobs
+
+    def outline(self, blob):
+        '''Contour and convex hull of a blob from the last largest() call.'''
+        contour = blob.contour
+        if contour is None:
+            # Trace the component, scanning only its bounding box
+            x, y, w, h = blob.bbox
+            component = cv2.compare(self.labels[y:y + h, x:x + w], blob.label,
+                                    cv2.CMP_EQ)
+            contours, hierarchy = cv2.findContours(
+                component, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE,
+                offset=(x, y))
+            contour = max(contours, key=len)
+        hull = cv2.convexHull(contour, False)
+        return contour, hull
@@ -0,0 +1,74 @@
+'''
+Depth visualization for the viewer. The z16 depth image is colorized
+through a lookup table with a BGR entry for each of the 65536 depth
+values, computed once, so a frame costs one gather instead of a scale, a
+colormap and their temporary images. Any depth-to-color mapping fits in
+the table; the default is the original convertScaleAbs(alpha=0.03) +
+COLORMAP_JET, pixel for pixel.
+
+SideBySide composes the color image and the colorized depth into the two
+halves of a canvas that is allocated once, replacing np.hstack.
+'''
+import cv2
+import numpy as np
+
+# 255 / 0.03: everything past 8.5m has the last color
+ALPHA = 0.03
+COLORMAP = cv2.COLORMAP_JET
+
+
+def depth_lut(alpha=ALPHA, colormap=COLORMAP):
+    '''(65536, 3) table, the BGR color of every z16 value.'''
+    depth = np.arange(65536, dtype=np.uint16).reshape(-1, 1)
+    lut = cv2.applyColorMap(cv2.convertScaleAbs(depth, alpha=alpha), colormap)
+    return lut.reshape(-1, 3)
+
+
+class DepthColorizer:
+    def __init__(self, alpha=ALPHA, colormap=COLORMAP):
+        # Entries packed as BGRA in a uint32, so the gather moves one
+        # word per pixel instead of three bytes
+        bgra = cv2.cvtColor(depth_lut(alpha, colormap).reshape(-1, 1, 3),
+                            cv2.COLOR_BGR2BGRA)
+        self.lut = bgra.reshape(-1).view(np.uint32)
+        self.index = None
+        self.packed = None
+        self.image = None
+
+    def colorize(self, depth, out=None):
+        '''Colorized depth, written to 'out' if given; reused by the next call.'''
+        if self.index is None or self.index.shape != depth.shape:
+            self.index = np.empty(depth.shape, np.intp)
+            self.packed = np.empty(depth.shape, np.uint32)
+            self.image = np.empty(depth.shape + (3,), np.uint8)
+        if out is None:
+            out = self.image
+        # np.take wants intp indices and a contiguous output, or it makes
+        # temporary copies of them
+        np.copyto(self.index, depth)
+        np.take(self.lut, self.index, out=self.packed, mode='clip')
+        bgra = self.packed.view(np.uint8).reshape(depth.shape + (4,))
+        cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR, dst=out)
+        return out
+
+
+class SideBySide:
+    '''Color on the left, colorized depth on the right, in one canvas.'''
+    def __init__(self, colorizer=None):
+        self.colorizer = colorizer or DepthColorizer()
+        self.canvas = None
+
+    def compose(self, color, depth=None, depth_colormap=None):
+        '''
+        Fill the canvas from the color image and either the depth image or
+        an already colorized one. The canvas is reused by the next call.
+        '''
+        h, w = color.shape[:2]
+        if self.canvas is None or self.canvas.shape != (h, 2 * w, 3):
+            self.canvas = np.empty((h, 2 * w, 3), np.uint8)
+        np.copyto(self.canvas[:, :w], color)
+        if depth_colormap is not None:
+            np.copyto(self.canvas[:, w:], depth_colormap)
+        else:
+            self.colorizer.colorize(depth, out=self.canvas[:, w:])
+        return self.canvas
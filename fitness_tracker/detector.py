@@ -1,160 +1,176 @@
-import pyrealsense2 as rs
-import numpy as np
+import argparse
+from collections import namedtuple
+import json
+
 import cv2
-import random
-import time
 
-# Configure depth and color streams
-pipeline = rs.pipeline()
-config = rs.config()
-config.enable_stream(rs.stream.depth, 640, 480, rs.format.z16, 30)
-config.enable_stream(rs.stream.color, 640, 480, rs.format.bgr8, 30)
-
-# Start streaming
-pipeline.start(config)
-
-# Background subtraction parameters
-first_pass = True
-passes = 0
-
-# Object detection parameters
-num_frames = 0
-punch_count = 0
-punch_detected = False
-DETECT_THRESH = 5
-AREA_THRESH = 1500
-
-# Fitness goal parameters
-punch_goal = random.randint(10, 30)
-round_over = False
-DIFFICULTY = 1.5
-
-# Set up a countdown timer
-from threading import Thread, Event
-class Countdown(Thread):
-    def __init__(self, event, count):
-        Thread.__init__(self)
-        self.stopped = event
-        self.count = count
-
-    def setCount(self, count):
-        self.count = count
-
-    def getCount(self):
-        return self.count
-
-    def run(self):
-        while(not self.stopped.wait(1)):
-            if(self.count > 0):
-                self.count-=1
-            else:
-                self.count=0
-stop_flag = Event()
-timer = Countdown(stop_flag, round(punch_goal*DIFFICULTY))
-timer.start()
-t_prev = timer.getCount()
+from frame_source import open_source
+from punch_detector import PunchDetector, MODES, MAX_LEVELS, \
+        DEPTH_NEAR, DEPTH_FAR, LEARNING_RATE
+from stages import Pipeline
+from parallel import FrameWorkers, preprocessor
+from blobs import METHODS
+from render import Renderer
+from rounds import RoundEngine
+from telemetry import profiler
+from stream import MJPEGStreamer, PORT, EVERY
+
+parser = argparse.ArgumentParser(description='RealSense punch counter')
+parser.add_argument('--source', default='realsense',
+                    help="'realsense', 'synthetic', a .bag file or a recording")
+parser.add_argument('--fps', type=float, default=30,
+                    help='replay rate for synthetic/recorded sources (0 = no limit)')
+parser.add_argument('--mode', choices=MODES, default='color',
+                    help='segment the glove by brightness or by distance')
+parser.add_argument('--near', type=float, default=DEPTH_NEAR,
+                    help='depth mode: closest fist distance in meters')
+parser.add_argument('--far', type=float, default=DEPTH_FAR,
+                    help='depth mode: farthest fist distance in meters')
+parser.add_argument('--levels', type=int, choices=range(MAX_LEVELS + 1),
+                    help='process at 1/2**levels resolution '
+                         '(default: 0 for color, 1 for depth)')
+parser.add_argument('--learning-rate', type=float, default=LEARNING_RATE,
+                    help='color mode: how fast the background adapts (0-1)')
+parser.add_argument('--blobs', choices=METHODS, default='contours',
+                    help='largest-blob extraction method')
+parser.add_argument('--gloves', type=int, default=1,
+                    help='track up to N gloves, each with its own punch count')
+parser.add_argument('--headless', action='store_true',
+                    help='no window and no drawing (unless streaming)')
+parser.add_argument('--stream', type=int, nargs='?', const=PORT, default=0,
+                    metavar='PORT', help='serve an MJPEG view over HTTP '
+                    '(port {} if not given)'.format(PORT))
+parser.add_argument('--stream-every', type=int, default=EVERY, metavar='N',
+                    help='stream every Nth frame')
+parser.add_argument('--events', metavar='FILE',
+                    help='append round/punch events to FILE as JSON lines')
+parser.add_argument('--metrics', type=int, metavar='PORT',
+                    help='serve per-stage timings at http://localhost:PORT/metrics')
+parser.add_argument('--trace', metavar='FILE',
+                    help='on exit, write a Chrome/Perfetto trace of the last frames')
+parser.add_argument('--workers', type=int, default=0,
+                    help='preprocess frames in N worker processes (0 = in this one)')
+parser.add_argument('--buffer', type=int, default=2,
+                    help='ring buffer size between pipeline stages')
+parser.add_argument('--report', type=float, default=5.0,
+                    help='seconds between latency reports (0 disables them)')
+args = parser.parse_args()
+
+# Object detection parameters; the detector's output masks must outlive
+# the results buffer plus the frame being displayed (and the two the
+# streamer may be holding on to). Contours are only traced if drawn.
+slots = args.buffer + 2
+if args.stream:
+    slots += 2
+detector_kwargs = dict(mode=args.mode,
+                       depth_near=args.near, depth_far=args.far,
+                       levels=args.levels, learning_rate=args.learning_rate,
+                       blob_method=args.blobs, max_tracks=args.gloves)
+detector = PunchDetector(slots=slots, outline=bool(args.stream or not args.headless),
+                         **detector_kwargs)
+
+# Worker processes are forked before the camera, the streamer or any
+# other thread is started
+workers = None
+if args.workers:
+    workers = FrameWorkers(preprocessor, (detector_kwargs,), workers=args.workers)
 
-try:
-    while True:
-
-        # Wait for a coherent pair of frames: depth and color
-        frames = pipeline.wait_for_frames()
-        depth_frame = frames.get_depth_frame()
-        color_frame = frames.get_color_frame()
-        if not depth_frame or not color_frame:
-            continue
-
-        # Convert images to numpy arrays
-        depth_image = np.asanyarray(depth_frame.get_data())
-        color_image = np.asanyarray(color_frame.get_data())
-        color_image = color_image[50:430,150:500,:]
-
-        # Threshold the image for color segmentation
-        gray = cv2.cvtColor(color_image, cv2.COLOR_BGR2GRAY)
-        gaussian_blur = cv2.GaussianBlur(gray, (21, 21), 0)
-        blur = cv2.blur(gaussian_blur, (5, 5))
-        # Subtract background (simplest approach)
-        if first_pass:
-            if(passes == 0):
-                background = blur
-            else:
-                background = cv2.addWeighted(blur, 0.5, background, 0.5, 0)
-            if(passes > 30):
-                first_pass = False
-            passes += 1
-            continue
-        foreground = cv2.subtract(blur, background)
-        ret, thresh = cv2.threshold(blur, 190, 255, cv2.THRESH_BINARY)
-        thresh = cv2.dilate(thresh, None, iterations=2)
-
-        # Find contours around segmented 'blobs'
-        contours, hierarchy = cv2.findContours(thresh, cv2.RETR_TREE, \
-                cv2.CHAIN_APPROX_SIMPLE)
-
-        # Set a placeholder output image
-        img_out = cv2.cvtColor(thresh, cv2.COLOR_GRAY2BGR)
-
-        # If we find any contours, get the largest one
-        if len(contours) >= 1:
-            contour = max(contours, key = lambda x: cv2.contourArea(x))
-            if(cv2.contourArea(contour) > AREA_THRESH):
-                # Create hull points for the largest contour
-                hull = cv2.convexHull(contour, False)
-                # Add contour and hull to the image for visualization
-                color_contour = (0, 255, 0)
-                color_hull    = (255, 255, 255)
-                cv2.drawContours(img_out, [contour], 0, color_contour, 2, 8)
-                cv2.drawContours(img_out, [hull], 0, color_hull, 2, 8)
-
-                # Count the number of frames where an object was detected
-                num_frames += 1
-                # If object detected long enough, count it as a punch
-                # avoid counting it more than once
-                if (not punch_detected and (num_frames > DETECT_THRESH)):
-                    punch_count += 1
-                    punch_detected = True
-            else:
-                punch_detected = False
-                num_frames = 0
-        # Set the success parameters
-        if(punch_count >= punch_goal):
-            msg = "SUCCESS!"
-            msg_color = (0,210,10)
-            msg_pos = (55,280)
-            round_over = True
-        # Get the timer data
-        t = timer.getCount()
-        if(t != t_prev):
-            t_prev = t
-        if(t < 1):
-            msg = "FAILED!"
-            msg_color = (0,10,210)
-            msg_pos = (75,280)
-            round_over = True
-        # Show images and fitness goal/counts
-        font = cv2.FONT_HERSHEY_SIMPLEX
-        cv2.namedWindow('RealSense', cv2.WINDOW_NORMAL)
-        cv2.resizeWindow('RealSense', 800, 400)
-        cv2.putText(img_out, "CNT:"+str(punch_count), (0,30), font, 1, (85,15,210), 3, cv2.LINE_AA)
-        cv2.putText(img_out, "{:02d}".format(t), (140,200), font, 2, (255,255,255), 5, cv2.LINE_AA)
-        cv2.putText(img_out, "TOT:"+str(punch_goal), (240,30), font, 1, (210,0,50), 3, cv2.LINE_AA)
-        # Display message in between rounds
-        if(round_over):
-            cv2.putText(img_out, msg, msg_pos, font, 2, msg_color, 5, cv2.LINE_AA)
+# Configure depth and color streams
+source = open_source(args.source, fps=args.fps)
+
+# Network view (optional)
+streamer = None
+if args.stream:
+    streamer = MJPEGStreamer(port=args.stream, every=args.stream_every)
+
+# Fitness goal parameters; round and punch events can be logged as
+# JSON lines
+events = open(args.events, 'a') if args.events else None
+def log_event(record):
+    line = json.dumps(record)
+    if events:
+        events.write(line + '\n')
+        events.flush()
+    if args.headless:
+        print(line)
+rounds = RoundEngine(on_event=log_event)
+
+# What the processing stage hands over to the display stage
+Result = namedtuple('Result', ['frame', 'detection', 'status'])
+
+# Processing stage: segmentation, punch counting and round logic
+def process(frame):
+    return count(frame, detector.process(frame))
+
+last_round = 0
+def count(frame, detection):
+    global last_round
+    if detection.mask is None:
+        # Still learning the background: the first round hasn't started
+        return Result(frame, detection, None)
+    status = rounds.update(punches=detection.punch)
+    if status.round != last_round:
+        # New round: the detector's (and every glove's) count starts over
+        detector.reset_count()
+        last_round = status.round
+    return Result(frame, detection, status)
+
+# Same with --workers: the blurring (or depth thresholding) happens in the
+# worker processes, the rest in frame order here
+def process_stream(frames):
+    for frame, image in workers.map(frames):
+        with profiler.section('process'):
+            mask = detector.segment(frame, image)
+            result = count(frame, detector.detect(frame, mask))
+        yield result
+
+# Display stage: draw the blobs and fitness goal/counts, unless headless
+# (then the events are printed by the processing stage)
+renderer = Renderer()
+def display(result):
+    if streamer:
+        streamer.submit(result)
+    if args.headless:
+        return
+    img_out = renderer.render(result)
+    if img_out is None:
+        return
+    with profiler.section('imshow'):
         cv2.imshow('RealSense', img_out)
         cv2.waitKey(1)
-        # Reset all parameters before starting a new round
-        if(round_over):
-            punch_count = 0
-            num_frames = 0
-            punch_goal = random.randint(10,30)
-            time.sleep(2)
-            timer.setCount(round(punch_goal*DIFFICULTY))
-            round_over = False
+
+if not args.headless:
+    cv2.namedWindow('RealSense', cv2.WINDOW_NORMAL)
+    cv2.resizeWindow('RealSense', 800, 400)
+
+# Telemetry: the pipeline prints a summary every --report seconds
+if args.metrics:
+    profiler.serve(args.metrics)
+if args.trace:
+    profiler.start_trace()
+
+pipeline = Pipeline(source, process_stream if args.workers else process,
+                    display, buffer_size=args.buffer, report_every=args.report,
+                    stream=bool(args.workers))
+try:
+    # Start streaming
+    source.start()
+    detector.depth_scale = source.depth_scale
+    if workers:
+        # Only known now that the camera runs; sent with every frame
+        workers.settings = {'depth_scale': source.depth_scale}
+    pipeline.run()
 
 finally:
 
     # Stop streaming
-    pipeline.stop()
-    # Stop the countdown timer
-    stop_flag.set()
+    source.stop()
+    if events:
+        events.close()
+    if streamer:
+        streamer.close()
+    if workers:
+        workers.close()
+    print(pipeline.report())
+    if args.trace:
+        print('wrote {} events to {}'.format(profiler.dump_trace(args.trace), args.trace))
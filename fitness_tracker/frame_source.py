@@ -0,0 +1,284 @@
+'''
+Frame sources for the RealSense demos. Every source hands out Frame
+tuples (index, timestamp, color, depth) so the detector doesn't care
+whether the pixels come from the camera, a .bag file, a recording or a
+generator.
+
+Recordings are directories holding color.npy (N x H x W x 3, uint8),
+depth.npy (N x H x W, uint16) and timestamps.npy (N, float64), which are
+memory-mapped on replay so frames are handed out without copying. An
+uncompressed .npz with the same three arrays works too (it is loaded into
+memory instead). To record from the camera:
+
+    python3 frame_source.py record session1 --frames 900
+'''
+from collections import namedtuple
+import argparse
+import os
+import time
+
+import numpy as np
+
+# Default stream configuration used by all the demos
+WIDTH = 640
+HEIGHT = 480
+FPS = 30
+
+Frame = namedtuple('Frame', ['index', 'timestamp', 'color', 'depth'])
+
+
+class FrameSource:
+    '''
+    Base class: subclasses implement read(), returning the next Frame or
+    None when the source is exhausted. depth_scale is meters per z16 unit.
+    '''
+    depth_scale = 0.001
+
+    def start(self):
+        return self
+
+    def read(self):
+        raise NotImplementedError
+
+    def stop(self):
+        pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def __iter__(self):
+        while True:
+            frame = self.read()
+            if frame is None:
+                return
+            yield frame
+
+
+class Pacer:
+    '''Sleeps just enough to hand out frames at a fixed rate (0 = no limit).'''
+    def __init__(self, fps):
+        self.fps = fps
+        self.t_next = None
+
+    def wait(self):
+        if not self.fps:
+            return
+        now = time.monotonic()
+        if self.t_next is None:
+            self.t_next = now
+        if self.t_next > now:
+            time.sleep(self.t_next - now)
+        self.t_next += 1.0 / self.fps
+
+
+class RealSenseSource(FrameSource):
+    '''
+    Live depth (z16) + color (bgr8) streams from a RealSense camera, or
+    the same streams played back from a .bag file recorded with the
+    RealSense Viewer. Playback runs as fast as the pipeline consumes it
+    unless real_time is set.
+
+    Depth is aligned to color (rs.align), so a pixel is the same point of
+    the scene in both images and the detector's ROI applies to either.
+    '''
+    def __init__(self, width=WIDTH, height=HEIGHT, fps=FPS, bag=None,
+                 real_time=False):
+        import pyrealsense2 as rs
+        self.pipeline = rs.pipeline()
+        self.config = rs.config()
+        self.bag = bag
+        self.real_time = real_time
+        if bag:
+            self.config.enable_device_from_file(bag, repeat_playback=False)
+        self.config.enable_stream(rs.stream.depth, width, height, rs.format.z16, fps)
+        self.config.enable_stream(rs.stream.color, width, height, rs.format.bgr8, fps)
+        self.align = rs.align(rs.stream.color)
+        self.index = 0
+
+    def start(self):
+        profile = self.pipeline.start(self.config)
+        self.depth_scale = profile.get_device().first_depth_sensor().get_depth_scale()
+        if self.bag:
+            profile.get_device().as_playback().set_real_time(self.real_time)
+        return self
+
+    def read(self):
+        while True:
+            # Wait for a coherent pair of frames: depth and color
+            if self.bag:
+                # try_wait_for_frames() times out at the end of the file
+                ok, frames = self.pipeline.try_wait_for_frames(1000)
+                if not ok:
+                    return None
+            else:
+                frames = self.pipeline.wait_for_frames()
+            # Depth reprojected into the color camera's pixels
+            frames = self.align.process(frames)
+            depth_frame = frames.get_depth_frame()
+            color_frame = frames.get_color_frame()
+            if depth_frame and color_frame:
+                break
+        # Convert images to numpy arrays (views on the frame memory)
+        depth_image = np.asanyarray(depth_frame.get_data())
+        color_image = np.asanyarray(color_frame.get_data())
+        frame = Frame(self.index, time.monotonic(), color_image, depth_image)
+        self.index += 1
+        return frame
+
+    def stop(self):
+        self.pipeline.stop()
+
+
+class SyntheticSource(FrameSource):
+    '''
+    Generates frames with a bright "glove" that moves in and out of the
+    detection area, so the detector can be exercised without a camera.
+    fps=0 produces frames as fast as possible; count=0 never ends. With
+    gloves > 1 the gloves sit side by side and punch out of phase.
+    '''
+    def __init__(self, width=WIDTH, height=HEIGHT, fps=FPS, count=0,
+                 period=30, seed=0, gloves=1):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.count = count
+        self.period = period
+        self.gloves = gloves
+        self.index = 0
+        rng = np.random.default_rng(seed)
+        # Static, dim background with a bit of noise; depth ~2m
+        self.background = rng.integers(40, 90, (height, width, 3), dtype=np.uint8)
+        # plus a small highlight (a lamp or a reflection) that is bright but
+        # too small to count as a glove
+        self.background[height // 5:height // 5 + 30, width // 3:width // 3 + 30] = 250
+        self.far = np.full((height, width), 2000, dtype=np.uint16)
+        self.pacer = Pacer(fps)
+
+    def punching(self, index, glove=0):
+        # The glove is in view for half of every period
+        shift = glove * self.period // (2 * self.gloves)
+        return ((index + shift) % self.period) < self.period // 2
+
+    def read(self):
+        if self.count and self.index >= self.count:
+            return None
+        self.pacer.wait()
+        color = self.background.copy()
+        depth = self.far.copy()
+        for glove in range(self.gloves):
+            if not self.punching(self.index, glove):
+                continue
+            # Bright disc (the glove) in the detection area, ~0.5m away
+            # from the camera
+            center = (self.width * (glove + 1) // (self.gloves + 1), self.height // 2)
+            radius = self.height // 8
+            yy, xx = np.ogrid[:self.height, :self.width]
+            disc = (xx - center[0]) ** 2 + (yy - center[1]) ** 2 <= radius ** 2
+            color[disc] = 235
+            depth[disc] = 500
+        frame = Frame(self.index, time.monotonic(), color, depth)
+        self.index += 1
+        return frame
+
+
+class ReplaySource(FrameSource):
+    '''
+    Replays a recording (see the module docstring). Frames are views into
+    the memory-mapped arrays, so with fps=0 the only limit is how fast the
+    consumer can go. Set loop to start over at the end of the recording.
+    '''
+    def __init__(self, path, fps=0, loop=False):
+        if os.path.isdir(path):
+            arrays = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+                      for name in ('color', 'depth', 'timestamps')}
+        else:
+            with np.load(path) as npz:
+                arrays = {name: npz[name] for name in ('color', 'depth', 'timestamps')}
+        self.color = arrays['color']
+        self.depth = arrays['depth']
+        self.timestamps = arrays['timestamps']
+        if not len(self.color) == len(self.depth) == len(self.timestamps):
+            raise ValueError('{}: color, depth and timestamps differ in length'.format(path))
+        self.loop = loop
+        self.pacer = Pacer(fps)
+        self.index = 0
+
+    def __len__(self):
+        return len(self.color)
+
+    def read(self):
+        i = self.index % len(self.color) if self.loop else self.index
+        if i >= len(self.color):
+            return None
+        self.pacer.wait()
+        frame = Frame(self.index, time.monotonic(), self.color[i], self.depth[i])
+        self.index += 1
+        return frame
+
+
+def open_source(spec, fps=FPS, loop=False):
+    '''
+    Frame source from a command line style spec: 'realsense', 'synthetic'
+    (or 'synthetic:N' for N gloves), a .bag file or a recording (directory
+    or .npz). fps only applies to the synthetic and recorded sources.
+    '''
+    if spec == 'realsense':
+        return RealSenseSource()
+    if spec == 'synthetic' or spec.startswith('synthetic:'):
+        gloves = spec.partition(':')[2]
+        return SyntheticSource(fps=fps, gloves=int(gloves or 1))
+    if spec.endswith('.bag'):
+        return RealSenseSource(bag=spec, real_time=bool(fps))
+    return ReplaySource(spec, fps=fps, loop=loop)
+
+
+def record(source, path, count):
+    '''Record up to count frames from source into a recording directory.'''
+    os.makedirs(path, exist_ok=True)
+    with source:
+        first = source.read()
+        if first is None:
+            raise ValueError('source produced no frames')
+        open_memmap = np.lib.format.open_memmap
+        color = open_memmap(os.path.join(path, 'color.npy'), mode='w+',
+                            dtype=np.uint8, shape=(count,) + first.color.shape)
+        depth = open_memmap(os.path.join(path, 'depth.npy'), mode='w+',
+                            dtype=np.uint16, shape=(count,) + first.depth.shape)
+        timestamps = np.zeros(count)
+        n = 0
+        frame = first
+        while frame is not None and n < count:
+            color[n] = frame.color
+            depth[n] = frame.depth
+            timestamps[n] = frame.timestamp - first.timestamp
+            n += 1
+            if n < count:
+                frame = source.read()
+    color.flush()
+    depth.flush()
+    del color, depth
+    if n < count:
+        # The source ran dry early: shrink the arrays to what was recorded
+        for name in ('color', 'depth'):
+            filename = os.path.join(path, name + '.npy')
+            data = np.load(filename, mmap_mode='r')[:n].copy()
+            np.save(filename, data)
+    np.save(os.path.join(path, 'timestamps.npy'), timestamps[:n])
+    return n
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Record frames for offline replay')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('record')
+    p.add_argument('path', help='output directory')
+    p.add_argument('--frames', type=int, default=300)
+    p.add_argument('--source', default='realsense',
+                   help="'realsense', 'synthetic' or a .bag file")
+    args = parser.parse_args()
+
+    n = record(open_source(args.source, fps=0), args.path, args.frames)
+    print('recorded {} frames to {}'.format(n, args.path))
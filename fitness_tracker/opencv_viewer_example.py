@@ -5,45 +5,101 @@
 ##      Open CV and Numpy integration        ##
 ###############################################
 
-import pyrealsense2 as rs
-import numpy as np
+import argparse
+import time
+
 import cv2
 
+from depth_view import DepthColorizer, SideBySide
+from frame_source import open_source
+from parallel import FrameWorkers
+from telemetry import profiler
+
+parser = argparse.ArgumentParser(description='RealSense color + depth viewer')
+parser.add_argument('--source', default='realsense',
+                    help="'realsense', 'synthetic', a .bag file or a recording")
+parser.add_argument('--fps', type=float, default=30,
+                    help='replay rate for synthetic/recorded sources (0 = no limit)')
+parser.add_argument('--report', type=float, default=5.0,
+                    help='seconds between timing summaries (0 disables them)')
+parser.add_argument('--metrics', type=int, metavar='PORT',
+                    help='serve timings at http://localhost:PORT/metrics')
+parser.add_argument('--display-fps', type=float, default=0,
+                    help='render at most this often while still reading every '
+                         'frame (0 = render every frame)')
+parser.add_argument('--workers', type=int, default=0,
+                    help='colorize depth in N worker processes (0 = in this one)')
+args = parser.parse_args()
+
+
+# Job factory for the worker processes: colorize depth into the output slot
+def colorizer():
+    depth_colorizer = DepthColorizer()
+    return lambda frame, out: depth_colorizer.colorize(frame.depth, out)
+
+def captured():
+    while True:
+        with profiler.section('capture'):
+            frame = source.read()
+        if frame is None:
+            return
+        yield frame
+
+
+# Worker processes are forked before the camera or any other thread
+# is started
+workers = None
+if args.workers:
+    workers = FrameWorkers(colorizer, workers=args.workers)
+
+# Telemetry
+if args.report:
+    profiler.start_reporter(args.report)
+if args.metrics:
+    profiler.serve(args.metrics)
+
 # Configure depth and color streams
-pipeline = rs.pipeline()
-config = rs.config()
-config.enable_stream(rs.stream.depth, 640, 480, rs.format.z16, 30)
-config.enable_stream(rs.stream.color, 640, 480, rs.format.bgr8, 30)
+source = open_source(args.source, fps=args.fps)
 
 # Start streaming
-pipeline.start(config)
+source.start()
 
-try:
-    while True:
+# Color and colorized depth side by side, in a canvas allocated once
+view = SideBySide()
+interval = 1.0 / args.display_fps if args.display_fps else 0
+next_display = 0
 
-        # Wait for a coherent pair of frames: depth and color
-        frames = pipeline.wait_for_frames()
-        depth_frame = frames.get_depth_frame()
-        color_frame = frames.get_color_frame()
-        if not depth_frame or not color_frame:
-            continue
+try:
+    if workers:
+        frames = workers.map(captured())
+    else:
+        frames = ((frame, None) for frame in captured())
 
-        # Convert images to numpy arrays
-        depth_image = np.asanyarray(depth_frame.get_data())
-        color_image = np.asanyarray(color_frame.get_data())
+    for frame, depth_colormap in frames:
 
-        # Apply colormap on depth image (image must be converted to 8-bit per pixel first)
-        depth_colormap = cv2.applyColorMap(cv2.convertScaleAbs(depth_image, alpha=0.03), cv2.COLORMAP_JET)
+        # Keep reading at the camera's rate, but only render as often as
+        # the display needs
+        if interval:
+            now = time.monotonic()
+            if now < next_display:
+                continue
+            next_display = max(next_display + interval, now)
 
-        # Stack both images horizontally
-        images = np.hstack((color_image, depth_colormap))
+        # Apply colormap on depth image (a lookup table, unless the workers
+        # did it) and put both images side by side
+        with profiler.section('compose'):
+            images = view.compose(frame.color, frame.depth, depth_colormap)
 
         # Show images
-        cv2.namedWindow('RealSense', cv2.WINDOW_AUTOSIZE)
-        cv2.imshow('RealSense', images)
-        cv2.waitKey(1)
+        with profiler.section('display'):
+            cv2.namedWindow('RealSense', cv2.WINDOW_AUTOSIZE)
+            cv2.imshow('RealSense', images)
+            cv2.waitKey(1)
 
 finally:
 
     # Stop streaming
-    pipeline.stop()
\ No newline at end of file
+    source.stop()
+    if workers:
+        workers.close()
+    print(profiler.summary())
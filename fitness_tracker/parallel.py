@@ -0,0 +1,199 @@
+'''
+Process pool for the per-frame work that doesn't depend on the previous
+frames, so the Pi's other cores can help the GIL-bound main loop.
+
+Frames are never pickled: the pool keeps 'slots' color, depth and output
+images in shared memory (multiprocessing.shared_memory), the main process
+copies each frame into a free slot and only sends (sequence, slot) to the
+workers. Each worker runs job(frame, out) on the slot's images and writes
+its result into the slot's output image. Results come back in frame
+order, whatever order the workers finish in:
+
+    pool = FrameWorkers(preprocessor, (detector_kwargs,), workers=3)
+    for frame, image in pool.map(frames):
+        ...   # 'image' is valid until the next iteration
+
+'job' is built in each worker by calling make_job(*args), so it can keep
+its own scratch buffers. The workers are forked (the scripts aren't
+importable, which rules out 'spawn'), so create the pool before starting
+anything that wouldn't survive a fork: the camera, the streamer, the
+telemetry threads. What is only known once those are running (e.g. the
+camera's depth scale) goes in pool.settings; they travel with every task
+and the workers rebuild their job with make_job(*args, **settings) when
+they change.
+'''
+from multiprocessing import get_context, resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from threading import Thread
+import queue
+
+import cv2
+import numpy as np
+
+from frame_source import Frame
+from punch_detector import PunchDetector
+from telemetry import profiler
+
+
+def preprocessor(detector_kwargs, **settings):
+    '''Job factory: the detector's stateless preprocessing step.'''
+    detector = PunchDetector(**dict(detector_kwargs, **settings))
+    return detector.preprocess
+
+
+def _arrays(blocks, layout):
+    return [np.ndarray(shape, dtype, buffer=shm.buf)
+            for shm, (name, shape, dtype) in zip(blocks, layout)]
+
+
+def _worker(make_job, args, tasks, done):
+    # One OpenCV thread per worker: the pool is the parallelism. The
+    # timings would never leave this process, so don't take them.
+    cv2.setNumThreads(1)
+    profiler.enabled = False
+    job = make_job(*args)
+    settings = {}
+    blocks = []
+    layout = None
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        seq, slot, task_layout, task_settings = task
+        if task_settings != settings:
+            settings = task_settings
+            job = make_job(*args, **settings)
+        if task_layout != layout:
+            for shm in blocks:
+                shm.close()
+            layout = task_layout
+            blocks = [SharedMemory(name) for name, shape, dtype in layout]
+            color, depth, out = _arrays(blocks, layout)
+        job(Frame(seq, 0.0, color[slot], depth[slot]), out[slot])
+        done.put((seq, slot))
+    for shm in blocks:
+        shm.close()
+
+
+class FrameWorkers:
+    def __init__(self, make_job, args=(), workers=3, slots=None):
+        self.make_job = make_job
+        self.args = args
+        # Extra make_job() keyword arguments, sent along with every task
+        self.settings = {}
+        # Enough frames in flight to keep every worker busy
+        self.slots = slots or 2 * workers
+        # Only used in this process, to find the output image size
+        self.probe = None
+        self.blocks = []
+        self.layout = None
+        self.arrays = None
+        # Workers must share this process's resource tracker: one of
+        # their own would unlink the segments when the worker exits
+        resource_tracker.ensure_running()
+        context = get_context('fork')
+        self.tasks = context.Queue()
+        self.done = context.Queue()
+        self.workers = [context.Process(target=_worker, daemon=True,
+                                        args=(make_job, args, self.tasks, self.done))
+                        for i in range(workers)]
+        for worker in self.workers:
+            worker.start()
+
+    def _allocate(self, frame):
+        if self.probe is None:
+            self.probe = self.make_job(*self.args, **self.settings)
+        out = self.probe(frame, None)
+        shapes = [frame.color.shape, frame.depth.shape, out.shape]
+        dtypes = [frame.color.dtype, frame.depth.dtype, out.dtype]
+        self.layout = []
+        for shape, dtype in zip(shapes, dtypes):
+            shape = (self.slots,) + shape
+            size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            shm = SharedMemory(create=True, size=size)
+            self.blocks.append(shm)
+            self.layout.append((shm.name, shape, np.dtype(dtype).str))
+        self.layout = tuple(self.layout)
+        self.arrays = _arrays(self.blocks, self.layout)
+
+    def map(self, frames):
+        '''
+        Yield (frame, output image) for every frame, in order. A feeder
+        thread reads 'frames' and keeps up to 'slots' of them in flight;
+        the output image is only valid until the next iteration.
+        '''
+        free = queue.Queue()
+        for slot in range(self.slots):
+            free.put(slot)
+        pending = {}
+        # Frames sent so far, whether the feeder is done and why
+        fed = {'count': 0, 'done': False, 'error': None}
+
+        def feed():
+            try:
+                for frame in frames:
+                    slot = free.get()
+                    if slot is None:
+                        return
+                    if self.arrays is None:
+                        self._allocate(frame)
+                    color, depth, out = self.arrays
+                    if frame.color.shape != color.shape[1:] or \
+                            frame.depth.shape != depth.shape[1:]:
+                        raise ValueError('frame size changed')
+                    np.copyto(color[slot], frame.color)
+                    np.copyto(depth[slot], frame.depth)
+                    seq = fed['count']
+                    pending[seq] = frame
+                    fed['count'] = seq + 1
+                    self.tasks.put((seq, slot, self.layout, self.settings))
+            except Exception as e:
+                fed['error'] = e
+            finally:
+                fed['done'] = True
+
+        feeder = Thread(target=feed, daemon=True)
+        feeder.start()
+        finished = {}
+        seq = 0
+        try:
+            while True:
+                if fed['done'] and seq == fed['count']:
+                    if fed['error']:
+                        raise fed['error']
+                    break
+                try:
+                    done_seq, slot = self.done.get(timeout=0.1)
+                except queue.Empty:
+                    if not all(worker.is_alive() for worker in self.workers):
+                        raise RuntimeError('a worker process died')
+                    continue
+                finished[done_seq] = slot
+                while seq in finished:
+                    slot = finished.pop(seq)
+                    frame = pending.pop(seq)
+                    yield frame, self.arrays[2][slot]
+                    free.put(slot)
+                    seq += 1
+        finally:
+            # Unblock the feeder if the consumer stopped early
+            free.put(None)
+
+    def close(self):
+        for worker in self.workers:
+            self.tasks.put(None)
+        for worker in self.workers:
+            worker.join(timeout=1.0)
+            if worker.is_alive():
+                worker.terminate()
+        self.arrays = None
+        for shm in self.blocks:
+            shm.close()
+            shm.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
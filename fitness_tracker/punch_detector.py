@@ -0,0 +1,287 @@
+'''
+Punch detection logic for the fitness tracker, pulled out of the main
+loop so it can run in its own pipeline stage (or offline, on recorded
+frames).
+
+Two segmentation modes are available: 'color' finds the glove as what is
+brighter than a running-average background of the blurred grayscale
+image, 'depth' keeps whatever is within a distance band from the camera,
+working on the z16 image. The depth mode needs no blurring and no
+background, and doesn't care about lighting.
+
+Both modes can work at reduced resolution: with levels=n the ROI is
+shrunk by 2**n (cv2.pyrDown for grayscale, subsampling for depth, which
+mustn't be averaged across edges). Kernel sizes and the area threshold
+are scaled to match, and contours are mapped back to ROI coordinates.
+
+The per-frame work doesn't allocate images: the ROI is a view on the
+frame memory and every OpenCV stage writes into a buffer from a pool
+that is allocated once, on the first frame.
+
+process(frame) is preprocess() -> segment() -> detect(). Only the first
+step is stateless (graying, pyramid and blur, or the depth band), so it
+can run in worker processes (see parallel.py); the background model and
+the punch debounce need the frames in order.
+'''
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from background import BackgroundModel, LEARNING_RATE, WARMUP
+from blobs import BlobExtractor
+from tracker import Tracker, MAX_TRACKS
+from telemetry import profiler
+
+# Region of the color image where the user punches. Depth frames are
+# aligned to color by the sources, so the same ROI crops the depth image.
+ROI = (slice(50, 430), slice(150, 500))
+
+# Object detection parameters
+DETECT_THRESH = 5
+AREA_THRESH = 1500
+# How much brighter than the background the glove must be
+FOREGROUND_THRESH = 40
+
+# Depth segmentation parameters: the fist is between DEPTH_NEAR and
+# DEPTH_FAR meters away
+MODES = ('color', 'depth')
+DEPTH_NEAR = 0.3
+DEPTH_FAR = 0.8
+DEPTH_SCALE = 0.001
+
+# Pyramid levels to go down before segmenting (resolution / 2**levels)
+DEFAULT_LEVELS = {'color': 0, 'depth': 1}
+MAX_LEVELS = 3
+
+# What the detector produces for every processed frame. mask is None
+# while the background is still being built; it may be smaller than the
+# ROI by a factor of 'scale', while blob, contour and hull are always in
+# ROI coordinates. blob is the largest blob if it's big enough to be a
+# glove; contour and hull are only traced when the detector was asked to
+# outline blobs (i.e. when they'll be drawn). punch is the number of
+# punches counted on this frame, punch_count the total, and tracks the
+# tracker's TrackedBlobs (one per glove followed).
+Detection = namedtuple('Detection', ['frame', 'mask', 'scale', 'blob',
+                                     'contour', 'hull', 'punch_count', 'punch',
+                                     'tracks'])
+
+
+def pyramid_shape(shape, levels):
+    '''Image size after 'levels' pyrDown calls (each rounds up).'''
+    h, w = shape
+    for i in range(levels):
+        h, w = (h + 1) // 2, (w + 1) // 2
+    return (h, w)
+
+
+class BufferPool:
+    '''
+    Working images for one ROI size and pyramid depth. The output masks
+    rotate through 'slots' buffers so a mask handed to a later pipeline
+    stage isn't overwritten until that many more frames have been
+    processed.
+    '''
+    def __init__(self, roi_shape, levels=0, slots=4, mode='color'):
+        self.key = (roi_shape, levels)
+        shape = pyramid_shape(roi_shape, levels)
+        self.shape = shape
+        if mode == 'color':
+            self.gray = np.empty(roi_shape, np.uint8)
+            self.pyramid = [np.empty(pyramid_shape(roi_shape, i), np.uint8)
+                            for i in range(1, levels + 1)]
+            self.gaussian_blur = np.empty(shape, np.uint8)
+            self.blur = np.empty(shape, np.uint8)
+            self.foreground = np.empty(shape, np.uint8)
+        self.thresh = np.empty(shape, np.uint8)
+        self.masks = [np.empty(shape, np.uint8) for i in range(slots)]
+        self.next_mask = 0
+
+    def mask(self):
+        mask = self.masks[self.next_mask]
+        self.next_mask = (self.next_mask + 1) % len(self.masks)
+        return mask
+
+
+class PunchDetector:
+    def __init__(self, detect_thresh=DETECT_THRESH, area_thresh=AREA_THRESH,
+                 slots=4, mode='color', depth_near=DEPTH_NEAR,
+                 depth_far=DEPTH_FAR, levels=None, depth_scale=DEPTH_SCALE,
+                 learning_rate=LEARNING_RATE, warmup=WARMUP, outline=True,
+                 blob_method='contours', max_tracks=MAX_TRACKS):
+        if mode not in MODES:
+            raise ValueError('mode must be one of {}'.format(MODES))
+        if levels is None:
+            levels = DEFAULT_LEVELS[mode]
+        if not 0 <= levels <= MAX_LEVELS:
+            raise ValueError('levels must be between 0 and {}'.format(MAX_LEVELS))
+        self.detect_thresh = detect_thresh
+        self.area_thresh = area_thresh
+        self.slots = slots
+        self.buffers = None
+        self.blobs = BlobExtractor(blob_method)
+        self.outline = outline
+        self.mode = mode
+        self.levels = levels
+        self.scale = 2 ** levels
+        # Kernels shrink with the image so they cover the same area
+        self.gaussian_ksize = max(3, (21 >> levels) | 1)
+        self.blur_ksize = max(3, (5 >> levels) | 1)
+        self.dilate_iterations = max(1, 2 >> levels)
+        # Depth band in meters; depth_scale is meters per z16 unit and
+        # should be updated from the camera once it's streaming
+        self.depth_near = depth_near
+        self.depth_far = depth_far
+        self.depth_scale = depth_scale
+        # Background subtraction parameters
+        self.learning_rate = learning_rate
+        self.warmup = warmup
+        self.background = None
+        # Object detection parameters: each glove gets its own debounce
+        self.tracker = Tracker(max_tracks, detect_thresh)
+        self.punch_count = 0
+
+    def reset_count(self):
+        # Called after process() on the frame a round starts on, so that
+        # frame's punches count towards the new round
+        self.tracker.reset()
+        self.punch_count = sum(track.punch_count for track in self.tracker.tracks)
+
+    def _pool(self, roi_shape):
+        key = (roi_shape, self.levels)
+        if self.buffers is None or self.buffers.key != key:
+            self.buffers = BufferPool(roi_shape, self.levels, self.slots, self.mode)
+        return self.buffers
+
+    def preprocess(self, frame, out=None):
+        '''
+        The stateless part of the work: the blurred grayscale image
+        ('color') or the depth band mask ('depth'), at working resolution.
+        It only depends on the frame, so it can run in another process;
+        'out' is where to write it (default: a buffer from the pool).
+        '''
+        if self.mode == 'depth':
+            return self._threshold_depth(frame, out)
+        return self._blur_color(frame, out)
+
+    def segment(self, frame, image):
+        '''
+        The stateful part: the mask for the preprocessed 'image', or None
+        while building the background. Frames must come in order.
+        '''
+        if self.mode == 'depth':
+            b = self._pool(frame.depth[ROI].shape)
+            if not any(image is mask for mask in b.masks):
+                # Preprocessed elsewhere: keep a copy that outlives 'image'
+                mask = b.mask()
+                np.copyto(mask, image)
+                return mask
+            return image
+        return self._segment_color(frame, image)
+
+    def _blur_color(self, frame, out):
+        # A view on the frame memory, not a copy
+        color_image = frame.color[ROI]
+        b = self._pool(color_image.shape[:2])
+        if out is None:
+            out = b.blur
+        with profiler.section('convert'):
+            cv2.cvtColor(color_image, cv2.COLOR_BGR2GRAY, dst=b.gray)
+            small = b.gray
+            for level in b.pyramid:
+                small = cv2.pyrDown(small, dst=level,
+                                    dstsize=(level.shape[1], level.shape[0]))
+        with profiler.section('blur'):
+            k = self.gaussian_ksize
+            cv2.GaussianBlur(small, (k, k), 0, dst=b.gaussian_blur)
+            k = self.blur_ksize
+            cv2.blur(b.gaussian_blur, (k, k), dst=out)
+        return out
+
+    def _segment_color(self, frame, blur):
+        '''Threshold the bright glove; None while building the background.'''
+        b = self._pool(frame.color[ROI].shape[:2])
+        if self.background is None or self.background.shape != b.shape:
+            self.background = BackgroundModel(b.shape, self.learning_rate,
+                                              self.warmup)
+        background = self.background
+        # Learn the background over the first frames
+        if not background.ready:
+            with profiler.section('background'):
+                background.update(blur)
+            return None
+        # Segment what is brighter than the background, then update the
+        # background everywhere except under the glove
+        with profiler.section('threshold'):
+            background.subtract(blur, dst=b.foreground)
+            cv2.threshold(b.foreground, FOREGROUND_THRESH, 255, cv2.THRESH_BINARY, dst=b.thresh)
+            mask = b.mask()
+            cv2.dilate(b.thresh, None, dst=mask, iterations=self.dilate_iterations)
+        with profiler.section('background'):
+            background.update(blur, foreground=mask)
+        return mask
+
+    def _threshold_depth(self, frame, out):
+        '''Keep the pixels within the depth band.'''
+        # Strided view: every scale-th pixel of the ROI, no copy
+        step = self.scale
+        depth_roi = frame.depth[ROI]
+        depth_image = depth_roi[::step, ::step]
+        b = self._pool(depth_roi.shape)
+        if out is None:
+            out = b.mask()
+
+        # Depth 0 means "no data", so it always falls outside the band
+        near = max(1, int(self.depth_near / self.depth_scale))
+        far = int(self.depth_far / self.depth_scale)
+        with profiler.section('threshold'):
+            cv2.inRange(depth_image, near, far, dst=b.thresh)
+            # Remove speckle, then close the holes in the fist
+            cv2.morphologyEx(b.thresh, cv2.MORPH_OPEN, None, dst=out)
+            cv2.dilate(out, None, dst=out)
+        return out
+
+    def process(self, frame):
+        return self.detect(frame, self.segment(frame, self.preprocess(frame)))
+
+    def detect(self, frame, mask):
+        '''Find the gloves in 'mask' and count punches.'''
+        scale = self.scale
+        if mask is None:
+            return Detection(frame, None, scale, None, None, None,
+                             self.punch_count, 0, [])
+
+        # Get the largest segmented 'blobs', as many as there can be
+        # gloves. Areas at reduced resolution are scale**2 times smaller.
+        with profiler.section('contours'):
+            blobs = self.blobs.largest_n(mask, self.tracker.max_tracks)
+        blobs = [blob for blob in blobs if blob.area * scale**2 > self.area_thresh]
+        contour = hull = None
+        if blobs and self.outline:
+            # Create contour and hull points for the largest blob
+            with profiler.section('hull'):
+                contour, hull = self.blobs.outline(blobs[0])
+            if scale != 1:
+                contour = contour * scale
+                hull = hull * scale
+        blobs = [_to_roi(blob, scale) for blob in blobs]
+        if blobs:
+            blobs[0] = blobs[0]._replace(contour=contour)
+
+        with profiler.section('tracking'):
+            tracks = self.tracker.update(blobs)
+        punch = sum(track.punch for track in tracks)
+        self.punch_count += punch
+        return Detection(frame, mask, scale, blobs[0] if blobs else None,
+                         contour, hull, self.punch_count, punch, tracks)
+
+
+def _to_roi(blob, scale):
+    '''Blob found at 1/scale resolution, in ROI coordinates (no contour).'''
+    if scale == 1:
+        return blob._replace(contour=None)
+    x, y, w, h = blob.bbox
+    cx, cy = blob.centroid
+    return blob._replace(area=blob.area * scale**2,
+                         bbox=(x * scale, y * scale, w * scale, h * scale),
+                         centroid=(cx * scale, cy * scale), contour=None)
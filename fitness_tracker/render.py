@@ -0,0 +1,75 @@
+'''
+Draws the punch counter's output: the segmented mask, the glove's
+contour and hull, the counts and the round messages. Each Renderer owns
+its canvas, so the window and the network stream can render on different
+threads.
+'''
+import cv2
+import numpy as np
+
+from punch_detector import ROI
+from rounds import SUCCESS, FAILED
+from telemetry import profiler
+
+font = cv2.FONT_HERSHEY_SIMPLEX
+color_contour = (0, 255, 0)
+color_hull    = (255, 255, 255)
+color_track   = (0, 200, 255)
+# Messages in between rounds: text, color, position
+messages = {
+    SUCCESS: ("SUCCESS!", (0,210,10), (55,280)),
+    FAILED: ("FAILED!", (0,10,210), (75,280)),
+}
+
+
+class Renderer:
+    def __init__(self):
+        self.img_out = None
+        self.mask_out = None
+
+    @profiler.timed('draw')
+    def render(self, result):
+        '''
+        Draw a processing result (with detection and round status
+        attributes) and return the image, or None while the detector has
+        no mask yet. The image is reused by the next call.
+        '''
+        detection = result.detection
+        status = result.status
+        mask = detection.mask
+        if mask is None or status is None:
+            return None
+        # Set a placeholder output image (reusing the previous frame's
+        # buffers), scaling reduced resolution masks back up to the ROI size
+        shape = detection.frame.color[ROI].shape[:2]
+        if self.img_out is None or self.img_out.shape[:2] != shape:
+            self.img_out = np.empty(shape + (3,), np.uint8)
+            self.mask_out = np.empty(shape, np.uint8)
+        img_out = self.img_out
+        if mask.shape != shape:
+            cv2.resize(mask, (shape[1], shape[0]), dst=self.mask_out,
+                       interpolation=cv2.INTER_NEAREST)
+            mask = self.mask_out
+        cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR, dst=img_out)
+        if detection.contour is not None:
+            # Add contour and hull to the image for visualization
+            cv2.drawContours(img_out, [detection.contour], 0, color_contour, 2, 8)
+            cv2.drawContours(img_out, [detection.hull], 0, color_hull, 2, 8)
+        if len(detection.tracks) > 1:
+            # Several gloves: label each with its ID and own count
+            for track in detection.tracks:
+                if track.blob is None:
+                    continue
+                x, y, w, h = (int(v) for v in track.blob.bbox)
+                cv2.rectangle(img_out, (x, y), (x + w, y + h), color_track, 1)
+                cv2.putText(img_out, "#{}:{}".format(track.id, track.punch_count),
+                            (x, max(y - 5, 15)), font, 0.6, color_track, 2, cv2.LINE_AA)
+        # Fitness goal/counts
+        cv2.putText(img_out, "CNT:"+str(status.count), (0,30), font, 1, (85,15,210), 3, cv2.LINE_AA)
+        cv2.putText(img_out, "{:02d}".format(status.time_left), (140,200), font, 2, (255,255,255), 5, cv2.LINE_AA)
+        cv2.putText(img_out, "TOT:"+str(status.goal), (240,30), font, 1, (210,0,50), 3, cv2.LINE_AA)
+        # Display message in between rounds
+        if status.state in messages:
+            msg, msg_color, msg_pos = messages[status.state]
+            cv2.putText(img_out, msg, msg_pos, font, 2, msg_color, 5, cv2.LINE_AA)
+        return img_out
@@ -0,0 +1,106 @@
+'''
+Round/timer logic for the punch counter. A round has a random punch goal
+and a deadline proportional to it; it ends in success or failure and is
+followed by a short cooldown while the result is on screen. Everything is
+evaluated against a monotonic clock from the processing loop, so there
+are no timer threads and nothing ever sleeps.
+
+Rounds and punches are reported as event records (plain dicts, ready for
+json.dumps) to an optional callback:
+
+    {'event': 'round_start', 'round': 1, 'goal': 17, 'duration': 26, 'time': 0.0}
+    {'event': 'punch', 'round': 1, 'count': 1, 'time': 1.8}
+    {'event': 'round_end', 'round': 1, 'result': 'success', 'count': 17,
+     'goal': 17, 'elapsed': 19.4, 'time': 19.4}
+
+'time' is in seconds since the engine was created.
+'''
+from collections import namedtuple
+import math
+import random
+import time
+
+# Fitness goal parameters
+GOAL_RANGE = (10, 30)
+DIFFICULTY = 1.5
+COOLDOWN = 2.0
+
+ACTIVE = 'active'
+SUCCESS = 'success'
+FAILED = 'failed'
+
+# What the display needs each frame; time_left is in whole seconds
+RoundStatus = namedtuple('RoundStatus', ['state', 'round', 'goal', 'count',
+                                         'time_left'])
+
+
+class RoundEngine:
+    def __init__(self, goal_range=GOAL_RANGE, difficulty=DIFFICULTY,
+                 cooldown=COOLDOWN, on_event=None, clock=time.monotonic,
+                 rng=random):
+        self.goal_range = goal_range
+        self.difficulty = difficulty
+        self.cooldown = cooldown
+        self.on_event = on_event
+        self.clock = clock
+        self.rng = rng
+        self.t0 = clock()
+        self.state = None
+        self.round = 0
+        self.goal = 0
+        self.count = 0
+        self.started = 0.0
+        self.deadline = 0.0
+        self.ended = 0.0
+
+    def _emit(self, now, event, **fields):
+        if self.on_event:
+            record = {'event': event, 'round': self.round}
+            record.update(fields)
+            record['time'] = round(now - self.t0, 3)
+            self.on_event(record)
+
+    def _start(self, now):
+        self.round += 1
+        self.goal = self.rng.randint(*self.goal_range)
+        self.count = 0
+        self.state = ACTIVE
+        self.started = now
+        self.deadline = now + round(self.goal * self.difficulty)
+        self._emit(now, 'round_start', goal=self.goal,
+                   duration=round(self.goal * self.difficulty))
+
+    def _end(self, now, state):
+        self.state = state
+        self.ended = now
+        self._emit(now, 'round_end', result=state, count=self.count,
+                   goal=self.goal, elapsed=round(now - self.started, 3))
+
+    def time_left(self, now):
+        end = now if self.state == ACTIVE else self.ended
+        return max(0, math.ceil(self.deadline - end))
+
+    def update(self, punches=0, now=None):
+        '''
+        Advance the round to 'now' (default: the clock), counting
+        'punches' new punches, and return the RoundStatus.
+        '''
+        if now is None:
+            now = self.clock()
+        if self.state is None:
+            self._start(now)
+        elif self.state != ACTIVE and now - self.ended >= self.cooldown:
+            # Reset all parameters before starting a new round
+            self._start(now)
+
+        if self.state == ACTIVE:
+            # Punches during the cooldown don't count
+            for i in range(punches):
+                self.count += 1
+                self._emit(now, 'punch', count=self.count)
+            if self.count >= self.goal:
+                self._end(now, SUCCESS)
+            elif now >= self.deadline:
+                self._end(now, FAILED)
+        return RoundStatus(self.state, self.round, self.goal, self.count,
+                           self.time_left(now))
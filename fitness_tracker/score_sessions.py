@@ -0,0 +1,276 @@
+'''
+Scores recorded workout sessions offline, to choose the detector's
+parameters without standing in front of the camera:
+
+    python3 score_sessions.py session1 session2 --labels labels.json
+    python3 score_sessions.py sessions/* --labels labels.json \
+        --sweep-detect 1:15 --sweep-area 500:5000:100 --top 20
+
+Each recording (see frame_source.py) goes through the detector's own
+segmentation, as fast as the CPU allows and one process per recording.
+That is the expensive part, and it doesn't depend on DETECT_THRESH or
+AREA_THRESH: all it leaves is, for every frame, the area of the largest
+blob and whether that blob continues the previous frame's (the
+tracker's gating). Punches for any pair of thresholds then come out of a
+few numpy operations on those arrays, so sweeping thousands of
+combinations is cheap. With --cache DIR the per-frame features are kept
+on disk and later sweeps skip the segmentation altogether.
+
+Labels are a JSON object mapping session names (the recording's file or
+directory name) to punch times in seconds from the start of the
+recording. A detected punch is a hit if a labeled punch is within
+--tolerance seconds of it, and a labeled punch is found if a detected
+one is within the tolerance: precision and recall are the fractions of
+hits and found punches.
+
+The scoring follows a single glove (the default detector); the counts
+for the chosen thresholds match what detector.py would count on the
+same frames with nothing dropped.
+'''
+import argparse
+from collections import namedtuple
+from multiprocessing import Pool
+import json
+import os
+import time
+
+import numpy as np
+
+from background import LEARNING_RATE
+from frame_source import ReplaySource
+from punch_detector import PunchDetector, MODES, MAX_LEVELS, DEFAULT_LEVELS, \
+        DETECT_THRESH, AREA_THRESH, DEPTH_NEAR, DEPTH_FAR
+from telemetry import profiler
+from tracker import cost, INFEASIBLE, MAX_DISTANCE
+
+# What a session boils down to: per frame, the time since the start of
+# the recording, the largest blob's area (in ROI pixels, 0 if none) and
+# whether it continues the previous frame's blob
+Features = namedtuple('Features', ['name', 'timestamps', 'areas', 'continues'])
+
+Score = namedtuple('Score', ['detect_thresh', 'area_thresh', 'punches',
+                             'hits', 'found', 'labeled'])
+
+
+def session_name(path):
+    return os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+
+
+def extract(path, segmentation):
+    '''Run the detector's segmentation over a recording -> Features.'''
+    detector = PunchDetector(outline=False, **segmentation)
+    source = ReplaySource(path)
+    n = len(source)
+    areas = np.zeros(n, np.float32)
+    continues = np.zeros(n, bool)
+    previous = None
+    scale2 = detector.scale ** 2
+    for i, frame in enumerate(source):
+        mask = detector.segment(frame, detector.preprocess(frame))
+        blob = detector.blobs.largest(mask) if mask is not None else None
+        if blob is not None:
+            areas[i] = blob.area * scale2
+            if previous is not None:
+                # Same gating as the tracker, at mask resolution
+                continues[i] = cost(previous, blob,
+                                    MAX_DISTANCE / detector.scale) < INFEASIBLE
+        previous = blob
+    return Features(session_name(path), np.asarray(source.timestamps, float),
+                    areas, continues)
+
+
+def cached_extract(job):
+    path, segmentation, cache = job
+    if cache:
+        key = '-'.join('{}'.format(segmentation[k]) for k in sorted(segmentation))
+        filename = os.path.join(cache, '{}-{}.npz'.format(session_name(path), key))
+        if os.path.exists(filename) and \
+                os.path.getmtime(filename) >= _mtime(path):
+            with np.load(filename) as data:
+                return Features(session_name(path), data['timestamps'],
+                                data['areas'], data['continues'])
+    features = extract(path, segmentation)
+    if cache:
+        np.savez(filename, timestamps=features.timestamps, areas=features.areas,
+                 continues=features.continues)
+    return features
+
+
+def _mtime(path):
+    if os.path.isdir(path):
+        return max(os.path.getmtime(os.path.join(path, name))
+                   for name in os.listdir(path))
+    return os.path.getmtime(path)
+
+
+def runs(features, area_thresh):
+    '''(first frame, length) of every run of frames with the same glove.'''
+    present = features.areas > area_thresh
+    extends = np.zeros_like(present)
+    extends[1:] = present[1:] & present[:-1] & features.continues[1:]
+    start = present & ~extends
+    starts = np.flatnonzero(start)
+    # Run number of every present frame, then frames per run
+    run = np.cumsum(start) - 1
+    lengths = np.bincount(run[present], minlength=len(starts))
+    return starts, lengths
+
+
+def punch_times(features, detect_thresh, area_thresh):
+    '''
+    Times of the punches the detector would count: a glove seen for more
+    than detect_thresh frames in a row counts once, on the frame that
+    crosses the threshold.
+    '''
+    starts, lengths = runs(features, area_thresh)
+    return features.timestamps[starts[lengths > detect_thresh] + detect_thresh]
+
+
+def matched(times, reference, tolerance):
+    '''How many of 'times' have an entry of 'reference' within tolerance.'''
+    if not len(times) or not len(reference):
+        return 0
+    # Neighbors on both sides of where each time would go in reference
+    i = np.searchsorted(reference, times)
+    left = reference[np.maximum(i - 1, 0)]
+    right = reference[np.minimum(i, len(reference) - 1)]
+    nearest = np.minimum(np.abs(times - left), np.abs(times - right))
+    return int(np.count_nonzero(nearest <= tolerance))
+
+
+def sweep(sessions, labels, detect_range, area_range, tolerance):
+    '''Score every (detect_thresh, area_thresh) pair over all sessions.'''
+    scores = []
+    for area_thresh in area_range:
+        per_session = [(features, runs(features, area_thresh),
+                        labels.get(features.name)) for features in sessions]
+        for detect_thresh in detect_range:
+            punches = hits = found = labeled = 0
+            for features, (starts, lengths), reference in per_session:
+                times = features.timestamps[starts[lengths > detect_thresh] + detect_thresh]
+                punches += len(times)
+                if reference is not None:
+                    hits += matched(times, reference, tolerance)
+                    found += matched(reference, times, tolerance)
+                    labeled += len(reference)
+            scores.append(Score(detect_thresh, area_thresh, punches, hits, found, labeled))
+    return scores
+
+
+def precision(score):
+    return score.hits / score.punches if score.punches else 0.0
+
+
+def recall(score):
+    return score.found / score.labeled if score.labeled else 0.0
+
+
+def f1(score):
+    p, r = precision(score), recall(score)
+    return 2 * p * r / (p + r) if p + r else 0.0
+
+
+def parse_range(spec, kind):
+    '''start:stop[:step] (stop included) or a single value.'''
+    parts = [kind(p) for p in spec.split(':')]
+    if len(parts) == 1:
+        return [parts[0]]
+    start, stop = parts[:2]
+    step = parts[2] if len(parts) > 2 else 1
+    return list(np.arange(start, stop + step / 2, step).astype(kind))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('recordings', nargs='+', help='recording directories or .npz files')
+    parser.add_argument('--labels', help='JSON file: session name -> punch times (s)')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='seconds between a detected and a labeled punch')
+    parser.add_argument('--detect', type=int, default=DETECT_THRESH,
+                        help='DETECT_THRESH to report punches for')
+    parser.add_argument('--area', type=float, default=AREA_THRESH,
+                        help='AREA_THRESH to report punches for')
+    parser.add_argument('--sweep-detect', metavar='START:STOP[:STEP]',
+                        help='sweep DETECT_THRESH over this range')
+    parser.add_argument('--sweep-area', metavar='START:STOP[:STEP]',
+                        help='sweep AREA_THRESH over this range')
+    parser.add_argument('--top', type=int, default=10,
+                        help='sweep: show the best N combinations')
+    parser.add_argument('--mode', choices=MODES, default='color')
+    parser.add_argument('--levels', type=int, choices=range(MAX_LEVELS + 1))
+    parser.add_argument('--near', type=float, default=DEPTH_NEAR)
+    parser.add_argument('--far', type=float, default=DEPTH_FAR)
+    parser.add_argument('--learning-rate', type=float, default=LEARNING_RATE)
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(),
+                        help='recordings segmented in parallel')
+    parser.add_argument('--cache', metavar='DIR',
+                        help='keep per-frame features in DIR between runs')
+    parser.add_argument('--output', metavar='FILE',
+                        help='write per-session punch times and counts as JSON')
+    args = parser.parse_args()
+
+    # Only what changes the masks goes here (and into the cache key)
+    segmentation = dict(mode=args.mode, depth_near=args.near, depth_far=args.far,
+                        learning_rate=args.learning_rate,
+                        levels=DEFAULT_LEVELS[args.mode] if args.levels is None
+                        else args.levels)
+    labels = {}
+    if args.labels:
+        with open(args.labels) as f:
+            labels = {name: np.sort(np.asarray(times, float))
+                      for name, times in json.load(f).items()}
+    if args.cache:
+        os.makedirs(args.cache, exist_ok=True)
+
+    profiler.enabled = False
+    t0 = time.perf_counter()
+    jobs = [(path, segmentation, args.cache) for path in args.recordings]
+    if args.jobs > 1 and len(jobs) > 1:
+        with Pool(min(args.jobs, len(jobs))) as pool:
+            sessions = pool.map(cached_extract, jobs)
+    else:
+        sessions = [cached_extract(job) for job in jobs]
+    frames = sum(len(features.areas) for features in sessions)
+    elapsed = time.perf_counter() - t0
+    print('segmented {} sessions, {} frames in {:.1f}s ({:.0f} fps)'.format(
+        len(sessions), frames, elapsed, frames / elapsed))
+
+    # Punches for the chosen thresholds, per session
+    results = {}
+    for features in sessions:
+        times = punch_times(features, args.detect, args.area)
+        results[features.name] = {'count': len(times),
+                                  'punches': [round(float(t), 3) for t in times]}
+        line = '{:>20}: {:4d} punches'.format(features.name, len(times))
+        reference = labels.get(features.name)
+        if reference is not None:
+            score = sweep([features], labels, [args.detect], [args.area],
+                          args.tolerance)[0]
+            results[features.name].update(labeled=len(reference),
+                                          precision=precision(score),
+                                          recall=recall(score))
+            line += ' / {} labeled, precision {:.1%}, recall {:.1%}'.format(
+                len(reference), precision(score), recall(score))
+        print(line)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+
+    if args.sweep_detect or args.sweep_area:
+        detect_range = parse_range(args.sweep_detect, int) if args.sweep_detect \
+            else [args.detect]
+        area_range = parse_range(args.sweep_area, float) if args.sweep_area \
+            else [args.area]
+        t0 = time.perf_counter()
+        scores = sweep(sessions, labels, detect_range, area_range, args.tolerance)
+        elapsed = time.perf_counter() - t0
+        print('swept {} combinations in {:.2f}s'.format(len(scores), elapsed))
+        if labels:
+            scores.sort(key=lambda s: (f1(s), precision(s)), reverse=True)
+        print('{:>7} {:>8} {:>8} {:>10} {:>7} {:>7}'.format(
+            'detect', 'area', 'punches', 'precision', 'recall', 'F1'))
+        for score in scores[:args.top]:
+            print('{:>7} {:>8.0f} {:>8} {:>10.1%} {:>7.1%} {:>7.3f}'.format(
+                score.detect_thresh, score.area_thresh, score.punches,
+                precision(score), recall(score), f1(score)))
@@ -0,0 +1,148 @@
+'''
+Staged capture -> processing -> display pipeline. Each stage runs on its
+own thread and stages are connected by small ring buffers that drop the
+oldest item when full, so a slow stage never makes the camera back up and
+downstream stages always work on the freshest frame.
+'''
+from collections import deque
+from threading import Thread, Condition
+import time
+
+from telemetry import profiler as default_profiler
+
+
+class RingBuffer:
+    '''Bounded, thread-safe FIFO that drops the oldest item when full.'''
+    def __init__(self, size=2):
+        self.items = deque(maxlen=size)
+        self.cond = Condition()
+        self.closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self.cond:
+            if len(self.items) == self.items.maxlen:
+                self.dropped += 1
+            self.items.append(item)
+            self.cond.notify()
+
+    def get(self, timeout=None):
+        '''Next item, or None on timeout / once closed and drained.'''
+        with self.cond:
+            self.cond.wait_for(lambda: self.items or self.closed, timeout)
+            if self.items:
+                return self.items.popleft()
+            return None
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def drained(self):
+        with self.cond:
+            return self.closed and not self.items
+
+
+class Pipeline:
+    '''
+    Runs source.read() on a capture thread, process(frame) on a worker
+    thread and display(result) on the calling thread (OpenCV's HighGUI
+    wants to live on the main thread). process() must return an object
+    with a 'frame' attribute so end-to-end latency can be measured.
+    Stage latencies go to the telemetry profiler as 'capture', 'process',
+    'display' and 'end-to-end'.
+
+    With stream=True, process is instead called once with an iterator
+    over the captured frames and must yield the results, which lets it
+    keep several frames in flight (see parallel.py). It then has to time
+    itself.
+    '''
+    def __init__(self, source, process, display, buffer_size=2, report_every=5.0,
+                 profiler=default_profiler, stream=False):
+        self.source = source
+        self.process = process
+        self.stream = stream
+        self.display = display
+        self.captured = RingBuffer(buffer_size)
+        self.results = RingBuffer(buffer_size)
+        self.report_every = report_every
+        self.profiler = profiler
+        self.running = False
+        self.threads = []
+
+    def _capture(self):
+        try:
+            while self.running:
+                with self.profiler.section('capture'):
+                    frame = self.source.read()
+                if frame is None:
+                    break
+                self.captured.put(frame)
+        finally:
+            self.captured.close()
+
+    def _frames(self):
+        while True:
+            frame = self.captured.get()
+            if frame is None:
+                return
+            yield frame
+
+    def _work(self):
+        try:
+            if self.stream:
+                for result in self.process(self._frames()):
+                    self.results.put(result)
+                return
+            while True:
+                frame = self.captured.get()
+                if frame is None:
+                    break
+                with self.profiler.section('process'):
+                    result = self.process(frame)
+                self.results.put(result)
+        finally:
+            self.results.close()
+
+    def start(self):
+        self.running = True
+        self.threads = [Thread(target=self._capture, daemon=True),
+                        Thread(target=self._work, daemon=True)]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.running = False
+        self.captured.close()
+        for thread in self.threads:
+            thread.join(timeout=1.0)
+
+    def run(self, max_frames=0):
+        '''Display loop; returns the number of frames displayed.'''
+        self.start()
+        shown = 0
+        t_report = time.monotonic() + self.report_every
+        try:
+            while not self.results.drained():
+                result = self.results.get(timeout=0.1)
+                if result is None:
+                    continue
+                with self.profiler.section('display'):
+                    self.display(result)
+                t1 = time.monotonic()
+                self.profiler.record('end-to-end', t1 - result.frame.timestamp)
+                shown += 1
+                if max_frames and shown >= max_frames:
+                    break
+                if self.report_every and t1 >= t_report:
+                    print(self.report())
+                    t_report = t1 + self.report_every
+        finally:
+            self.stop()
+        return shown
+
+    def report(self):
+        return '{}\n{:>12}: {} at capture, {} at process'.format(
+            self.profiler.summary(), 'dropped', self.captured.dropped,
+            self.results.dropped)
@@ -0,0 +1,123 @@
+'''
+Network view for the fitness tracker: every Nth result is rendered and
+JPEG-encoded on a background thread and served as an MJPEG stream, so
+any browser on the network can be the gym display. Open
+
+    http://<pi address>:8080/
+
+to watch. Only the newest frame is kept; a slow encoder or client just
+skips frames.
+'''
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread, Condition
+
+import cv2
+
+from render import Renderer
+from stages import RingBuffer
+from telemetry import profiler
+
+PORT = 8080
+EVERY = 3
+QUALITY = 70
+
+PAGE = b'''<!DOCTYPE html>
+<html>
+  <head><title>Punch Counter</title></head>
+  <body style="margin:0; background:black">
+    <img src="/stream.mjpg" style="width:100%; height:100vh; object-fit:contain">
+  </body>
+</html>
+'''
+
+
+class MJPEGStreamer:
+    def __init__(self, port=PORT, every=EVERY, quality=QUALITY):
+        self.every = every
+        self.quality = quality
+        self.pending = RingBuffer(1)
+        self.renderer = Renderer()
+        self.submitted = 0
+        # Latest encoded frame and its sequence number
+        self.jpeg = None
+        self.seq = 0
+        self.cond = Condition()
+        self.running = True
+        self.encoder = Thread(target=self._encode, daemon=True)
+        self.encoder.start()
+
+        streamer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/':
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/html')
+                    self.send_header('Content-Length', str(len(PAGE)))
+                    self.end_headers()
+                    self.wfile.write(PAGE)
+                elif self.path == '/stream.mjpg':
+                    streamer._serve_stream(self)
+                else:
+                    self.send_error(404)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('', port), Handler)
+        self.server.daemon_threads = True
+        Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def submit(self, result):
+        '''Called for every result; only every Nth one gets encoded.'''
+        self.submitted += 1
+        if self.submitted % self.every == 0 and result.detection.mask is not None:
+            self.pending.put(result)
+
+    def _encode(self):
+        params = [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+        while self.running:
+            result = self.pending.get()
+            if result is None:
+                continue
+            image = self.renderer.render(result)
+            if image is None:
+                continue
+            with profiler.section('jpeg'):
+                ok, jpeg = cv2.imencode('.jpg', image, params)
+            if ok:
+                with self.cond:
+                    self.jpeg = jpeg.tobytes()
+                    self.seq += 1
+                    self.cond.notify_all()
+
+    def _serve_stream(self, handler):
+        handler.send_response(200)
+        handler.send_header('Cache-Control', 'no-cache')
+        handler.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=frame')
+        handler.end_headers()
+        seq = 0
+        try:
+            while self.running:
+                with self.cond:
+                    if not self.cond.wait_for(lambda: self.seq != seq or not self.running,
+                                              timeout=5.0):
+                        continue
+                    jpeg, seq = self.jpeg, self.seq
+                if jpeg is None:
+                    continue
+                handler.wfile.write(b'--frame\r\n'
+                                    b'Content-Type: image/jpeg\r\n'
+                                    b'Content-Length: ' + str(len(jpeg)).encode() +
+                                    b'\r\n\r\n' + jpeg + b'\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # The browser went away
+            pass
+
+    def close(self):
+        self.running = False
+        self.pending.close()
+        with self.cond:
+            self.cond.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,237 @@
+'''
+Lightweight instrumentation for the vision loops. Wrap the interesting
+parts of a loop in sections:
+
+    from telemetry import profiler
+
+    with profiler.section('blur'):
+        cv2.GaussianBlur(...)
+
+    @profiler.timed('draw')
+    def draw(...):
+        ...
+
+Each section feeds a histogram with log-spaced microsecond buckets (four
+per power of two, so percentiles are within ~20%); recording a sample is
+a few arithmetic operations and memory use is fixed no matter how long
+the loop runs. From there you can:
+
+    profiler.summary()              text table (count, mean, p50/p95/p99, max, fps)
+    profiler.start_reporter(5.0)    print the summary every 5 seconds
+    profiler.serve(9000)            JSON at http://localhost:9000/metrics
+    profiler.start_trace()          keep the last events for...
+    profiler.dump_trace('t.json')   ...chrome://tracing or ui.perfetto.dev
+
+Set profiler.enabled = False to turn sections into no-ops.
+'''
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread, Lock, Event, get_ident
+import functools
+import json
+import math
+import os
+import time
+
+# Every power of two of microseconds [2**(e-1), 2**e) is split into SUB
+# equal buckets; bucket 0 is everything under 1us and the last one
+# everything over ~17 minutes
+SUB = 4
+OCTAVES = 31
+BUCKETS = OCTAVES * SUB
+
+
+def bucket_bound(i):
+    '''Upper bound, in seconds, of bucket i.'''
+    e, sub = divmod(i, SUB)
+    if e == 0:
+        return 1e-6
+    return 2 ** (e - 1) * (1 + (sub + 1) / SUB) * 1e-6
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.first = None
+        self.last = None
+
+    def add(self, seconds, now):
+        us = seconds * 1e6
+        if us >= 1:
+            m, e = math.frexp(us)
+            bucket = e * SUB + int((m - 0.5) * 2 * SUB)
+        else:
+            bucket = 0
+        self.counts[min(bucket, BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        if self.first is None:
+            self.first = now
+        self.last = now
+
+    def percentile(self, q):
+        '''Upper bound (seconds) of the bucket holding the q-th quantile.'''
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= target:
+                return min(bucket_bound(i), self.max)
+        return self.max
+
+    def rate(self):
+        '''Samples per second over the time the section has been active.'''
+        if self.count < 2 or self.last == self.first:
+            return 0.0
+        return (self.count - 1) / (self.last - self.first)
+
+    def stats(self):
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count * 1e3 if self.count else 0.0,
+            'p50_ms': self.percentile(0.50) * 1e3,
+            'p95_ms': self.percentile(0.95) * 1e3,
+            'p99_ms': self.percentile(0.99) * 1e3,
+            'max_ms': self.max * 1e3,
+            'per_second': self.rate(),
+        }
+
+
+class _Section:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, time.perf_counter() - self.start, self.start)
+
+
+class _NullSection:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_null_section = _NullSection()
+
+
+class Profiler:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.histograms = {}
+        self.lock = Lock()
+        self.trace = None
+        self.stopped = Event()
+
+    def section(self, name):
+        if not self.enabled:
+            return _null_section
+        return _Section(self, name)
+
+    def timed(self, name):
+        '''Decorator: time every call of the function as section 'name'.'''
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.section(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def record(self, name, seconds, start=None):
+        '''Add a sample; start (perf_counter) is only needed for tracing.'''
+        now = time.perf_counter()
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(seconds, now)
+            if self.trace is not None:
+                if start is None:
+                    start = now - seconds
+                self.trace.append((name, start, seconds, get_ident()))
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+
+    def stats(self):
+        with self.lock:
+            return {name: h.stats() for name, h in self.histograms.items()}
+
+    def summary(self):
+        lines = ['{:>12} {:>7} {:>8} {:>8} {:>8} {:>8} {:>8} {:>7}'.format(
+            'section', 'count', 'mean ms', 'p50', 'p95', 'p99', 'max', '/s')]
+        for name, s in self.stats().items():
+            lines.append('{:>12} {:>7} {:>8.2f} {:>8.2f} {:>8.2f} {:>8.2f} {:>8.2f} {:>7.1f}'.format(
+                name, s['count'], s['mean_ms'], s['p50_ms'], s['p95_ms'],
+                s['p99_ms'], s['max_ms'], s['per_second']))
+        return '\n'.join(lines)
+
+    def start_reporter(self, interval=5.0, output=print):
+        '''Print the summary every interval seconds from a daemon thread.'''
+        def report():
+            while not self.stopped.wait(interval):
+                output(self.summary())
+        Thread(target=report, daemon=True).start()
+
+    def serve(self, port, host='127.0.0.1'):
+        '''Serve the stats as JSON on http://host:port/metrics.'''
+        profiler = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = json.dumps(profiler.stats(), indent=1).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def start_trace(self, capacity=100000):
+        '''Keep the last 'capacity' section events for dump_trace().'''
+        with self.lock:
+            self.trace = deque(maxlen=capacity)
+
+    def dump_trace(self, path):
+        '''Write the traced events in Chrome's trace event format.'''
+        with self.lock:
+            events = list(self.trace or ())
+        pid = os.getpid()
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': [
+                {'name': name, 'ph': 'X', 'ts': start * 1e6, 'dur': seconds * 1e6,
+                 'pid': pid, 'tid': tid}
+                for name, start, seconds, tid in events]}, f)
+        return len(events)
+
+    def stop(self):
+        self.stopped.set()
+
+
+# Shared by all the modules of a process
+profiler = Profiler()
@@ -0,0 +1,60 @@
+import pytest
+
+from frame_source import ReplaySource, SyntheticSource, record
+from punch_detector import PunchDetector
+
+FRAMES = 300
+
+# Synthetic sessions: one glove, and two punching out of phase
+SESSIONS = {'s1': 1, 's2': 2}
+
+# Punches counted on each session, per mode. The color mode misses the
+# first punch of each glove while it learns the background.
+EXPECTED = {
+    ('s1', 'color'): 9,
+    ('s1', 'depth'): 10,
+    ('s2', 'color'): 18,
+    ('s2', 'depth'): 20,
+}
+
+
+@pytest.fixture(scope='module')
+def recordings(tmp_path_factory):
+    root = tmp_path_factory.mktemp('sessions')
+    paths = {}
+    for name, gloves in SESSIONS.items():
+        paths[name] = str(root / name)
+        assert record(SyntheticSource(fps=0, gloves=gloves), paths[name], FRAMES) == FRAMES
+    return paths
+
+
+@pytest.mark.parametrize('session, mode', sorted(EXPECTED))
+def test_punch_counts(recordings, session, mode):
+    detector = PunchDetector(mode=mode, outline=False)
+    punches = 0
+    for frame in ReplaySource(recordings[session]):
+        punches += detector.process(frame).punch
+    assert punches == EXPECTED[session, mode]
+    assert detector.punch_count == EXPECTED[session, mode]
+
+
+@pytest.mark.parametrize('mode', ['color', 'depth'])
+def test_split_steps_match_process(recordings, mode):
+    # preprocess/segment/detect (the worker pool's split) counts the same
+    # punches on the same frames as process()
+    whole = PunchDetector(mode=mode, outline=False)
+    split = PunchDetector(mode=mode, outline=False)
+    for frame in ReplaySource(recordings['s2']):
+        expected = whole.process(frame)
+        detection = split.detect(frame, split.segment(frame, split.preprocess(frame)))
+        assert detection.punch == expected.punch
+    assert split.punch_count == whole.punch_count == EXPECTED['s2', mode]
+
+
+def test_replay_matches_the_source(recordings):
+    replayed = list(ReplaySource(recordings['s1']))
+    assert len(replayed) == FRAMES
+    for frame, original in zip(replayed, SyntheticSource(fps=0, count=FRAMES)):
+        assert frame.index == original.index
+        assert (frame.color == original.color).all()
+        assert (frame.depth == original.depth).all()
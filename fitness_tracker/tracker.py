@@ -0,0 +1,196 @@
+'''
+Keeps persistent IDs on the gloves in view, so two users (or two gloves)
+each get their own punch count and a reflection can't steal the count
+from the real glove.
+
+Every frame, the largest blobs (at most max_tracks of them) are matched
+to the existing tracks by minimizing a cost that mixes bounding box
+overlap and centroid distance; pairs farther apart than max_distance
+with no overlap are never matched. The assignment is solved exactly
+(Hungarian algorithm) on a matrix that is at most max_tracks square, so
+the time per frame is bounded whatever the mask looks like.
+
+Each track has its own punch debounce: a punch is counted once a glove
+has been seen for more than detect_thresh frames in a row, and the track
+must lose its blob before it can punch again. A track that loses its
+blob keeps its ID for max_missed frames in case it comes back.
+'''
+from collections import namedtuple
+import math
+
+# Tracking parameters
+MAX_TRACKS = 1
+MAX_DISTANCE = 100
+# Frames a track keeps its ID without a glove (a second at 30fps)
+MAX_MISSED = 30
+# Cost of a pair that mustn't be matched
+INFEASIBLE = 1e9
+
+# What the detector reports for every live track. blob is None while
+# the track is missing its glove.
+TrackedBlob = namedtuple('TrackedBlob', ['id', 'blob', 'punch_count', 'punch'])
+
+
+def iou(a, b):
+    '''Intersection over union of two (x, y, w, h) boxes.'''
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    w = min(ax + aw, bx + bw) - max(ax, bx)
+    h = min(ay + ah, by + bh) - max(ay, by)
+    if w <= 0 or h <= 0:
+        return 0.0
+    inter = w * h
+    return inter / (aw * ah + bw * bh - inter)
+
+
+def cost(a, b, max_distance=MAX_DISTANCE):
+    '''Cost of matching blob a to blob b, INFEASIBLE if too far apart.'''
+    (x0, y0), (x1, y1) = a.centroid, b.centroid
+    distance = math.hypot(x1 - x0, y1 - y0)
+    overlap = iou(a.bbox, b.bbox)
+    if distance > max_distance and not overlap:
+        return INFEASIBLE
+    return (1 - overlap) + distance / max_distance
+
+
+def assign(matrix):
+    '''
+    Minimum cost assignment for an n x m cost matrix (a list of rows).
+    Returns (row, column) pairs, one per row if n <= m, else one per
+    column. O(n**2 * m).
+    '''
+    n = len(matrix)
+    m = len(matrix[0]) if n else 0
+    if n > m:
+        transposed = [[matrix[i][j] for i in range(n)] for j in range(m)]
+        return [(i, j) for j, i in assign(transposed)]
+    # Shortest augmenting paths with potentials u (rows) and v (columns);
+    # row and column 0 are sentinels
+    u = [0.0] * (n + 1)
+    v = [0.0] * (m + 1)
+    match = [0] * (m + 1)
+    way = [0] * (m + 1)
+    for i in range(1, n + 1):
+        match[0] = i
+        j0 = 0
+        minv = [math.inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0 = match[j0]
+            row = matrix[i0 - 1]
+            delta = math.inf
+            j1 = 0
+            for j in range(1, m + 1):
+                if not used[j]:
+                    c = row[j - 1] - u[i0] - v[j]
+                    if c < minv[j]:
+                        minv[j] = c
+                        way[j] = j0
+                    if minv[j] < delta:
+                        delta = minv[j]
+                        j1 = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[match[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if match[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            match[j0] = match[j1]
+            j0 = j1
+    return [(match[j] - 1, j - 1) for j in range(1, m + 1) if match[j]]
+
+
+class Track:
+    __slots__ = ('id', 'blob', 'missed', 'num_frames', 'punch_detected',
+                 'punch_count')
+
+    def __init__(self, id, blob):
+        self.id = id
+        self.blob = blob
+        self.missed = 0
+        self.num_frames = 0
+        self.punch_detected = False
+        self.punch_count = 0
+
+
+class Tracker:
+    def __init__(self, max_tracks=MAX_TRACKS, detect_thresh=5,
+                 max_distance=MAX_DISTANCE, max_missed=MAX_MISSED):
+        self.max_tracks = max_tracks
+        self.detect_thresh = detect_thresh
+        self.max_distance = max_distance
+        self.max_missed = max_missed
+        self.tracks = []
+        self.next_id = 1
+
+    def reset(self):
+        '''
+        Start every glove's count over. A punch from the last update()
+        (the frame a new round starts on) stays counted.
+        '''
+        for track in self.tracks:
+            punched = track.punch_detected and track.num_frames == self.detect_thresh + 1
+            track.punch_count = int(punched)
+            if not punched:
+                track.num_frames = 0
+
+    def update(self, blobs):
+        '''
+        Match this frame's blobs (largest first, at most max_tracks of
+        them) to the tracks and advance their debounce. Returns a
+        TrackedBlob per live track, ordered by ID.
+        '''
+        blobs = blobs[:self.max_tracks]
+        tracks = self.tracks
+        matched = {}
+        if tracks and blobs:
+            costs = [[cost(track.blob, blob, self.max_distance) for blob in blobs]
+                     for track in tracks]
+            for t, b in assign(costs):
+                if costs[t][b] < INFEASIBLE:
+                    matched[b] = tracks[t]
+        # Blobs nobody claimed start new tracks
+        for b, blob in enumerate(blobs):
+            if b not in matched:
+                track = Track(self.next_id, blob)
+                self.next_id += 1
+                tracks.append(track)
+                matched[b] = track
+        seen = set()
+        for b, track in matched.items():
+            track.blob = blobs[b]
+            track.missed = 0
+            seen.add(track)
+        for track in tracks:
+            if track not in seen:
+                # Glove lost: ready for the next punch
+                track.missed += 1
+                track.num_frames = 0
+                track.punch_detected = False
+        # Forget tracks missing for too long, and the longest missing ones
+        # when there are more tracks than blobs allowed
+        tracks = [track for track in tracks if track.missed <= self.max_missed]
+        tracks.sort(key=lambda track: track.missed)
+        self.tracks = tracks = sorted(tracks[:self.max_tracks],
+                                      key=lambda track: track.id)
+
+        states = []
+        for track in tracks:
+            punch = False
+            if not track.missed:
+                # Count the number of frames where the glove was detected;
+                # if long enough, count it as a punch (only once)
+                track.num_frames += 1
+                if not track.punch_detected and track.num_frames > self.detect_thresh:
+                    track.punch_count += 1
+                    track.punch_detected = True
+                    punch = True
+            states.append(TrackedBlob(track.id, None if track.missed else track.blob,
+                                      track.punch_count, punch))
+        return states
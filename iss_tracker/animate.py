@@ -1,7 +1,7 @@
 #!/usr/bin/env python
 
-import colorsys
 import time
+from functools import lru_cache
 from sys import exit
 
 try:
@@ -9,40 +9,83 @@ try:
 except ImportError:
     exit('This script requires the numpy module\nInstall with: sudo pip install numpy')
 
-import blinkt
+NUM_PIXELS = 8
 
-blinkt.set_clear_on_exit()
+def load_leds(fake=False):
+    # Imported here so everything else works without the LED strip
+    if fake:
+        import fake_blinkt as leds
+    else:
+        import blinkt as leds
+    leds.set_clear_on_exit()
+    return leds
 
 def make_gaussian(fwhm):
-    x = np.arange(0, blinkt.NUM_PIXELS, 1, float)
+    x = np.arange(0, NUM_PIXELS, 1, float)
     y = x[:, np.newaxis]
     x0, y0 = 3.5, 3.5
     fwhm = fwhm
     gauss = np.exp(-4 * np.log(2) * ((x - x0) ** 2 + (y - y0) ** 2) / fwhm ** 2)
     return gauss
 
-def animate(hue, times=1):
+# fwhm = 5/z for every frame: shrinking to a point and growing back
+ZOOM = list(range(1, 10)[::-1]) + list(range(1, 10))
+FRAME_TIME = 0.04
+
+def hsv_to_rgb(h, s, v):
+    # colorsys.hsv_to_rgb for numpy arrays (or any mix of arrays and numbers)
+    h, s, v = np.broadcast_arrays(np.asarray(h, float), np.asarray(s, float),
+                                  np.asarray(v, float))
+    i = np.floor(h * 6.0)
+    f = h * 6.0 - i
+    p = v * (1.0 - s)
+    q = v * (1.0 - s * f)
+    t = v * (1.0 - s * (1.0 - f))
+    i = i.astype(int) % 6
+    r = np.choose(i, [v, q, p, p, t, v])
+    g = np.choose(i, [t, v, v, q, p, p])
+    b = np.choose(i, [p, p, t, v, v, q])
+    return np.stack([r, g, b], axis=-1)
+
+@lru_cache(maxsize=16)
+def frames(hue):
+    # Every frame of the animation for a hue, as a (frames, pixels, 3)
+    # uint8 array. Only row y=4 of the 8x8 gaussian was ever shown, so
+    # that's all that gets computed.
+    fwhm = 5.0 / np.array(ZOOM, float)[:, np.newaxis]
+    x = np.arange(NUM_PIXELS, dtype=float)
+    v = np.exp(-4 * np.log(2) * ((x - 3.5) ** 2 + (4 - 3.5) ** 2) / fwhm ** 2)
+    rgb = hsv_to_rgb(hue, 1.0, v)
+    # Truncated like int(255.0 * i) was
+    table = (255.0 * rgb).astype(np.uint8)
+    table.flags.writeable = False
+    return table
+
+def animate(hue, times=1, leds=None, stop=None):
+    # stop: a threading.Event, checked every frame to cut the animation short
+    if leds is None:
+        leds = load_leds()
+    # Plain ints for set_pixel, looked up once per animation
+    table = frames(hue).tolist()
     for i in range(times):
-        for z in list(range(1, 10)[::-1]) + list(range(1, 10)):
-            fwhm = 5.0 / z
-            gauss = make_gaussian(fwhm)
+        for frame in table:
+            if stop is not None and stop.is_set():
+                return False
             start = time.time()
-            y = 4
 
-            for x in range(blinkt.NUM_PIXELS):
-                h = hue
-                s = 1.0
-                v = gauss[x, y]
-                rgb = colorsys.hsv_to_rgb(h, s, v)
-                r, g, b = [int(255.0 * i) for i in rgb]
-                blinkt.set_pixel(x, r, g, b)
+            for x, (r, g, b) in enumerate(frame):
+                leds.set_pixel(x, r, g, b)
 
-            blinkt.show()
+            leds.show()
             end = time.time()
             t = end - start
 
-            if t < 0.04:
-                time.sleep(0.04 - t)
+            if t < FRAME_TIME:
+                if stop is not None:
+                    stop.wait(FRAME_TIME - t)
+                else:
+                    time.sleep(FRAME_TIME - t)
+    return True
 
 if(__name__ == '__main__'):
     animate(0.9,2)
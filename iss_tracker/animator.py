@@ -0,0 +1,73 @@
+'''
+Plays the LED animations on a thread of its own, so the web server never
+waits for the LEDs:
+
+    animator = Animator(leds)
+    animator.post(next_pass)    # returns straight away
+
+There's a single slot for what to play next and the newest post wins:
+posts that arrive while an animation plays replace each other rather than
+queue up. If the newest one needs a different animation (the pass got
+closer, or started) the current one is cut short at the next frame; if
+it's the same animation it plays to the end and then starts over.
+'''
+import threading
+
+from animate import animate, load_leds
+
+
+def pattern(next_pass):
+    '''(hue, repetitions) for the seconds left until the next pass.'''
+    if next_pass > 60:
+        return 275. / 360, 2
+    if next_pass > 1:
+        return 200. / 360, 5
+    return 30. / 360, 8
+
+
+class Animator:
+    def __init__(self, leds=None):
+        # None: the real blinkt, loaded by the thread when it starts
+        self.leds = leds
+        self.cond = threading.Condition()
+        self.pending = None
+        self.playing = None
+        self.stop = threading.Event()
+        self.thread = None
+        self.played = 0
+
+    def post(self, next_pass):
+        '''Show next_pass from now on.'''
+        wanted = pattern(next_pass)
+        with self.cond:
+            self.pending = wanted
+            if self.playing is not None and self.playing != wanted:
+                self.stop.set()
+            self.cond.notify()
+            if self.thread is None:
+                # Started by the first post, in the process serving requests
+                # (not in the debug reloader's parent)
+                self.thread = threading.Thread(target=self._run, name='leds', daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        if self.leds is None:
+            self.leds = load_leds()
+        while True:
+            with self.cond:
+                while self.pending is None:
+                    self.cond.wait()
+                self.playing, self.pending = self.pending, None
+                self.stop.clear()
+            hue, times = self.playing
+            animate(hue, times, leds=self.leds, stop=self.stop)
+            with self.cond:
+                self.playing = None
+                self.played += 1
+                self.cond.notify_all()
+
+    def wait_idle(self, timeout=None):
+        '''Wait for nothing to be playing or pending (for tests).'''
+        with self.cond:
+            return self.cond.wait_for(
+                lambda: self.playing is None and self.pending is None, timeout)
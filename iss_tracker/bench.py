@@ -0,0 +1,208 @@
+'''
+Benchmarks for the ISS tracker that run without the LED strip (on
+fake_blinkt), e.g.
+
+    python3 bench.py frames --repeat 200
+    python3 bench.py passes --hours 24
+    python3 bench.py tracks --satellites 50
+    python3 bench.py catalog --objects 30000
+'''
+import argparse
+import colorsys
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+from sgp4.api import Satrec
+
+import fake_blinkt
+from animate import ZOOM, frames, make_gaussian
+from passes import PassCache, ecef_to_geodetic, julian, load_tle, predict, propagate
+from tle_catalog import Catalog, parse
+from tracks import track_payload
+
+HUES = (275. / 360, 200. / 360, 30. / 360)
+
+
+def old_frames(hue, leds):
+    # What animate() did before: a new 8x8 gaussian and colorsys per pixel, every frame
+    for z in ZOOM:
+        gauss = make_gaussian(5.0 / z)
+        for x in range(leds.NUM_PIXELS):
+            rgb = colorsys.hsv_to_rgb(hue, 1.0, gauss[x, 4])
+            r, g, b = [int(255.0 * i) for i in rgb]
+            leds.set_pixel(x, r, g, b)
+        leds.show()
+
+
+def table_frames(hue, leds):
+    for frame in frames(hue).tolist():
+        for x, (r, g, b) in enumerate(frame):
+            leds.set_pixel(x, r, g, b)
+        leds.show()
+
+
+def per_frame(play, repeat):
+    '''CPU microseconds per frame, over repeat plays of every hue.'''
+    fake_blinkt.frames = 0
+    t0 = time.process_time()
+    for _ in range(repeat):
+        for hue in HUES:
+            play(hue, fake_blinkt)
+    return (time.process_time() - t0) / fake_blinkt.frames * 1e6
+
+
+def bench_frames(args):
+    frames.cache_clear()
+    t0 = time.process_time()
+    for hue in HUES:
+        frames(hue)
+    print('frame tables for {} hues: {:.0f} us'.format(
+        len(HUES), (time.process_time() - t0) * 1e6))
+    print('per frame, gaussian + colorsys: {:7.1f} us'.format(per_frame(old_frames, args.repeat)))
+    print('per frame, table lookup:        {:7.1f} us'.format(per_frame(table_frames, args.repeat)))
+    print(frames.cache_info())
+
+
+def bench_passes(args):
+    name, sat = load_tle(args.tle)[0]
+    # From the TLE's epoch, where its predictions are good
+    start = (sat.jdsatepoch + sat.jdsatepochF - 2440587.5) * 86400
+    steps = int(args.hours * 3600 / args.step) + 1
+
+    jd, fr = julian(start + np.arange(steps) * args.step)
+    jd, fr = jd.tolist(), fr.tolist()
+    t0 = time.perf_counter()
+    for i in range(steps):
+        sat.sgp4(jd[i], fr[i])
+    print('{} points one sgp4() call each:  {:7.1f} ms'.format(
+        steps, (time.perf_counter() - t0) * 1e3))
+
+    t0 = time.perf_counter()
+    passes = predict(sat, args.lat, args.lon, start=start, hours=args.hours, step=args.step)
+    print('predict(), sgp4_array and numpy: {:7.1f} ms, {} passes of {}'.format(
+        (time.perf_counter() - t0) * 1e3, len(passes), name))
+
+    cache = PassCache(sat, hours=args.hours)
+    cache.passes(args.lat, args.lon, now=start)
+    t0 = time.perf_counter()
+    for i in range(1000):
+        cache.passes(args.lat, args.lon, now=start + i)
+    print('cached, per call:                {:7.3f} ms'.format(time.perf_counter() - t0))
+
+
+def bench_tracks(args):
+    # The same satellite over and over is as much work as different ones
+    sats = (load_tle(args.tle) * args.satellites)[:args.satellites]
+    sat = sats[0][1]
+    start = (sat.jdsatepoch + sat.jdsatepochF - 2440587.5) * 86400
+    times = start + np.arange(0, args.minutes * 60 + args.step, args.step)
+
+    t0 = time.perf_counter()
+    plain = []
+    for name, sat in sats:
+        lat, lon, alt = ecef_to_geodetic(propagate(sat, times))
+        plain.append({'name': name, 'lat': lat.tolist(), 'lon': lon.tolist(), 'alt': alt.tolist()})
+    plain = json.dumps(plain)
+    print('{} satellites x {} points, one at a time: {:7.1f} ms, {:8.0f} bytes as JSON floats'.format(
+        len(sats), len(times), (time.perf_counter() - t0) * 1e3, len(plain)))
+
+    t0 = time.perf_counter()
+    body = json.dumps(track_payload(sats, start, args.minutes, args.step), separators=(',', ':'))
+    print('{} satellites x {} points, batched:       {:7.1f} ms, {:8.0f} bytes as deltas'.format(
+        len(sats), len(times), (time.perf_counter() - t0) * 1e3, len(body)))
+
+
+def checksum(line):
+    return line + str(sum(int(c) if c.isdigit() else c == '-' for c in line) % 10)
+
+
+def synthetic_catalog(objects, seed=0):
+    '''A TLE file's text with objects made up satellites.'''
+    rng = np.random.default_rng(seed)
+    lines = []
+    for i in range(objects):
+        satnum = 10000 + i
+        lines.append('SAT {}'.format(satnum))
+        lines.append(checksum('1 {:05d}U 98067A   24{:012.8f}  .00016717  00000-0  30057-3 0  999'.format(
+            satnum, rng.uniform(1, 365))))
+        lines.append(checksum('2 {:05d} {:8.4f} {:8.4f} {:07d} {:8.4f} {:8.4f} {:11.8f} 1434'.format(
+            satnum, rng.uniform(0, 180), rng.uniform(0, 360), rng.integers(0, 100000),
+            rng.uniform(0, 360), rng.uniform(0, 360), rng.uniform(11, 16))))
+    return '\n'.join(lines) + '\n'
+
+
+def bench_catalog(args):
+    text = synthetic_catalog(args.objects)
+    path = os.path.join(tempfile.mkdtemp(prefix='bench_'), 'catalog.txt')
+    with open(path, 'w') as f:
+        f.write(text)
+    print('{} objects, {:.1f} MB of TLEs'.format(args.objects, len(text) / 1e6))
+
+    t0 = time.perf_counter()
+    lines = text.splitlines()
+    sats = {}
+    for i in range(0, len(lines), 3):
+        sat = Satrec.twoline2rv(lines[i + 1], lines[i + 2])
+        sats[sat.satnum] = (lines[i], sat)
+    print('  Satrec for every object:  {:8.1f} ms'.format((time.perf_counter() - t0) * 1e3))
+
+    t0 = time.perf_counter()
+    table, rejected = parse(text)
+    print('  parse() to the table:     {:8.1f} ms, {:.1f} MB, {} rejected'.format(
+        (time.perf_counter() - t0) * 1e3, table.nbytes / 1e6, rejected))
+
+    t0 = time.perf_counter()
+    catalog = Catalog(path)
+    print('  Catalog() from the file:  {:8.1f} ms'.format((time.perf_counter() - t0) * 1e3))
+
+    ids = np.random.default_rng(1).choice(table['satnum'], args.lookups)
+    t0 = time.perf_counter()
+    catalog.lookup(ids)
+    print('  lookup of {} ids at once: {:8.3f} ms'.format(
+        args.lookups, (time.perf_counter() - t0) * 1e3))
+    t0 = time.perf_counter()
+    for satnum in ids:
+        catalog.lookup([satnum])
+    print('  lookup of one id:         {:8.3f} ms'.format(
+        (time.perf_counter() - t0) * 1e3 / len(ids)))
+    t0 = time.perf_counter()
+    catalog.satrecs(ids[:100])
+    print('  100 Satrecs, first time:  {:8.3f} ms'.format((time.perf_counter() - t0) * 1e3))
+    t0 = time.perf_counter()
+    catalog.satrecs(ids[:100])
+    print('  100 Satrecs, cached:      {:8.3f} ms'.format((time.perf_counter() - t0) * 1e3))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='ISS tracker benchmarks')
+    sub = parser.add_subparsers(dest='bench', required=True)
+
+    p = sub.add_parser('frames', help='CPU time per animation frame')
+    p.add_argument('--repeat', type=int, default=100)
+    p.set_defaults(func=bench_frames)
+
+    p = sub.add_parser('passes', help='pass prediction cost')
+    p.add_argument('--tle', default='static/stations.txt')
+    p.add_argument('--hours', type=float, default=24)
+    p.add_argument('--step', type=float, default=10, help='seconds between grid points')
+    p.add_argument('--lat', type=float, default=34.138760)
+    p.add_argument('--lon', type=float, default=-118.070156)
+    p.set_defaults(func=bench_passes)
+
+    p = sub.add_parser('tracks', help='ground tracks: batched and delta-encoded vs. one by one')
+    p.add_argument('--tle', default='static/stations.txt')
+    p.add_argument('--satellites', type=int, default=50)
+    p.add_argument('--minutes', type=int, default=120)
+    p.add_argument('--step', type=int, default=30)
+    p.set_defaults(func=bench_tracks)
+
+    p = sub.add_parser('catalog', help='TLE catalog load and lookup at catalog scale')
+    p.add_argument('--objects', type=int, default=30000)
+    p.add_argument('--lookups', type=int, default=1000)
+    p.set_defaults(func=bench_catalog)
+
+    args = parser.parse_args()
+    args.func(args)
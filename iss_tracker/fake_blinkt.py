@@ -0,0 +1,48 @@
+'''
+Stand-in for the blinkt module, to run the tracker (and the animations)
+without the LED strip:
+
+    python3 iss_tracker.py --fake-leds
+
+It keeps the pixels in memory and counts the frames shown; with
+verbose set it also prints every frame.
+'''
+NUM_PIXELS = 8
+BRIGHTNESS = 7
+
+pixels = [[0, 0, 0, BRIGHTNESS / 31.0] for _ in range(NUM_PIXELS)]
+frames = 0
+last_frame = None
+verbose = False
+
+
+def set_clear_on_exit(value=True):
+    pass
+
+
+def set_brightness(brightness):
+    for pixel in pixels:
+        pixel[3] = brightness
+
+
+def set_pixel(x, r, g, b, brightness=None):
+    pixels[x][:3] = [int(r) & 0xff, int(g) & 0xff, int(b) & 0xff]
+    if brightness is not None:
+        pixels[x][3] = brightness
+
+
+def get_pixel(x):
+    return tuple(pixels[x])
+
+
+def clear():
+    for pixel in pixels:
+        pixel[:3] = [0, 0, 0]
+
+
+def show():
+    global frames, last_frame
+    frames += 1
+    last_frame = [tuple(pixel[:3]) for pixel in pixels]
+    if verbose:
+        print(' '.join('{:02x}{:02x}{:02x}'.format(*pixel) for pixel in last_frame))
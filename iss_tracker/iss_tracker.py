@@ -1,7 +1,16 @@
 #!/bin/python3
-from flask import Flask, render_template, request
+from flask import Flask, render_template, request, abort
+import argparse
 import json
-from animate import animate
+import os
+import threading
+import time
+import zlib
+from functools import lru_cache
+from animator import Animator
+from passes import PassCache
+from tle_catalog import Catalog
+from tracks import track_payload
 
 filename = "/boot/api_key.txt"
 api_key = ''
@@ -9,10 +18,54 @@ with open(filename,'r') as f:
     api_key = f.read().splitlines()[0]
     f.close()
 
+# The LEDs animate on their own thread; /status only tells it what to show
+animator = Animator()
+
 app = Flask(__name__,
             static_url_path='',
             static_folder='static',)
 
+# Passes are predicted here from the TLE, no need for open-notify
+tle_file = os.path.join(app.root_path, 'static', 'stations.txt')
+catalog = Catalog(tle_file)
+
+ISS = 25544
+
+def iss():
+    # The ISS's (name, Satrec), or whatever comes first in a catalog without it
+    try:
+        return catalog.satrecs([ISS])[0]
+    except KeyError:
+        return catalog.satrecs(catalog.table['satnum'][:1])[0]
+
+pass_cache = PassCache(iss()[1])
+
+# Ground tracks start on a multiple of this (seconds), so everyone asking
+# within the same few minutes shares one answer (and the browser's cache)
+TRACK_BUCKET = 300
+# Satellites per /tracks or /tle request
+MAX_IDS = 500
+
+def tle_changed():
+    pass_cache.set_sat(iss()[1])
+    _tracks.cache_clear()
+
+catalog.on_change.append(tle_changed)
+
+# Where the LEDs count down to the next pass for (the dashboard's default)
+observer = {'lat': 34.138760, 'lon': -118.070156, 'alt': 0.0}
+
+def drive_leds():
+    # Once a second, like the dashboard used to POST /status
+    while True:
+        now = time.time()
+        upcoming = pass_cache.passes(observer['lat'], observer['lon'],
+                                     observer['alt'], now)
+        if upcoming:
+            # Negative while the ISS is overhead
+            animator.post(upcoming[0]['risetime'] - now)
+        time.sleep(1)
+
 @app.route('/orbit')
 def orbit():
     return render_template('orbit.html', api_key=api_key)
@@ -26,20 +79,127 @@ def blink():
     status = {}
     req = request.get_json()
     if(req["next_pass"] is not None):
-        show_animation(req["next_pass"])
+        animator.post(req["next_pass"])
         status["status"] = "OK"
     else:
         status["status"] = "NOT OK"
     return json.dumps(status)
 
-def show_animation(time):
-    if(time>60):
-        animate(275./360,2)
-        return
-    if(time>1):
-        animate(200./360,5)
-        return
-    animate(30./360,8)
+def _coordinate(name, default, limit):
+    value = request.args.get(name, default, type=float)
+    if value is None or not -limit <= value <= limit:
+        abort(400)
+    return value
+
+@app.route('/passes')
+def passes():
+    # Same shape as open-notify's iss-pass.json, plus settime and max_elevation
+    lat = _coordinate('lat', observer['lat'], 90)
+    lon = _coordinate('lon', observer['lon'], 180)
+    alt = request.args.get('alt', 0.0, type=float) / 1000.
+    n = request.args.get('n', 5, type=int)
+    now = int(time.time())
+    response = pass_cache.passes(lat, lon, alt, now)[:n]
+    return json.dumps({'message': 'success',
+                       'request': {'datetime': now, 'latitude': lat, 'longitude': lon,
+                                   'altitude': alt * 1000., 'passes': n},
+                       'response': response})
+
+def _ids():
+    # ?ids=25544,20580 (the ISS if not given)
+    try:
+        ids = tuple(int(i) for i in request.args.get('ids', str(ISS)).split(','))
+    except ValueError:
+        abort(400)
+    if not 1 <= len(ids) <= MAX_IDS:
+        abort(400)
+    return ids
+
+@lru_cache(maxsize=8)
+def _tracks(start, minutes, step, ids, version):
+    body = json.dumps(track_payload(catalog.satrecs(ids), start, minutes, step),
+                      separators=(',', ':'))
+    return body, '{:08x}-{}-{}-{}'.format(zlib.crc32(body.encode()), start, minutes, step)
+
+@app.route('/tracks')
+def tracks():
+    # The satellites asked for from the start of this bucket, for minutes,
+    # every step seconds
+    minutes = request.args.get('minutes', 120, type=int)
+    step = request.args.get('step', 30, type=int)
+    if not 1 <= minutes <= 24 * 60 or not 5 <= step <= 600:
+        abort(400)
+    ids = _ids()
+    now = time.time()
+    start = int(now // TRACK_BUCKET * TRACK_BUCKET)
+    try:
+        body, etag = _tracks(start, minutes, step, ids, catalog.version)
+    except KeyError:
+        abort(404)
+    headers = {'ETag': '"{}"'.format(etag),
+               # Good until the next bucket starts
+               'Cache-Control': 'public, max-age={}'.format(int(start + TRACK_BUCKET - now)),
+               'Content-Type': 'application/json'}
+    # Weak comparison, as If-None-Match calls for
+    if request.if_none_match.contains_weak(etag):
+        return '', 304, headers
+    return body, 200, headers
+
+@app.route('/tle')
+def tle():
+    # Elements of the satellites asked for, straight from the catalog
+    try:
+        rows = catalog.lookup(_ids())
+    except KeyError:
+        abort(404)
+    satellites = []
+    for row in rows:
+        entry = {'id': int(row['satnum']), 'name': row['name'].decode().strip(),
+                 # Unix time
+                 'epoch': (row['epoch'] - 2440587.5) * 86400,
+                 'line1': row['line1'].decode(), 'line2': row['line2'].decode()}
+        for field in ('ndot', 'nddot', 'bstar', 'inclination', 'raan', 'eccentricity',
+                      'argp', 'mean_anomaly', 'mean_motion'):
+            entry[field] = float(row[field])
+        satellites.append(entry)
+    return json.dumps({'loaded': catalog.loaded, 'satellites': satellites})
+
+@app.route('/observer', methods=['POST'])
+def set_observer():
+    req = request.get_json()
+    try:
+        lat, lon = float(req['lat']), float(req['lon'])
+        # Meters, like the passes' altitude parameter
+        alt = float(req.get('alt', 0.0)) / 1000.
+    except (KeyError, TypeError, ValueError):
+        return json.dumps({'status': 'NOT OK'}), 400
+    observer.update(lat=lat, lon=lon, alt=alt)
+    return json.dumps({'status': 'OK'})
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='ISS tracker dashboard')
+    parser.add_argument('--fake-leds', action='store_true',
+                        help='no LED strip: use fake_blinkt instead')
+    parser.add_argument('--tle', default=tle_file,
+                        help='TLE file or URL, e.g. '
+                             'https://celestrak.org/NORAD/elements/gp.php?GROUP=stations&FORMAT=tle')
+    parser.add_argument('--tle-refresh', type=float, default=12,
+                        help='hours between TLE refreshes')
+    args = parser.parse_args()
+    if args.tle != tle_file:
+        catalog.source = args.tle
+        if args.tle.startswith(('http://', 'https://')):
+            # The last download, for when the network is down at startup
+            catalog.cache_file = os.path.join(app.root_path, 'tle_cache.txt')
+            if os.path.isfile(catalog.cache_file):
+                with open(catalog.cache_file) as f:
+                    catalog.load(f.read())
+        catalog.refresh()
+    if args.fake_leds:
+        import fake_blinkt
+        animator.leds = fake_blinkt
+    # Only in the process that serves, not the debug reloader watching it
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        threading.Thread(target=drive_leds, name='passes', daemon=True).start()
+        catalog.start(args.tle_refresh)
     app.run(host='0.0.0.0', debug=True)
@@ -0,0 +1,194 @@
+'''
+Pass prediction for an observer from a TLE, on the Pi itself, instead of
+asking api.open-notify.org:
+
+    name, sat = load_tle('static/stations.txt')[0]
+    predict(sat, 34.1388, -118.0702, start=time.time())
+
+The satellite is propagated with SGP4 (the sgp4 module) over a grid of
+times in one call, rotated from the TEME frame to Earth-fixed with the
+sidereal time (the same formula orbit.js uses) and seen from the
+observer as an elevation above the horizon. A pass is a run of grid
+points above MIN_ELEVATION; its rise and set are interpolated between
+grid points, so they're good to about a second.
+
+Pass tables are cached per observer (PassCache), since a table for the
+next day only changes when the day runs out or the TLE changes.
+'''
+from collections import OrderedDict
+from sys import exit
+import threading
+import time
+
+try:
+    import numpy as np
+    from sgp4.api import Satrec
+except ImportError:
+    exit('This script requires the numpy and sgp4 modules\n'
+         'Install with: sudo pip install numpy sgp4')
+
+MIN_ELEVATION = 10.0     # degrees, like open-notify
+STEP = 10.0              # seconds between grid points
+HOURS = 24.0             # how far ahead to look
+
+# WGS84
+EARTH_RADIUS = 6378.137
+FLATTENING = 1 / 298.257223563
+E2 = FLATTENING * (2 - FLATTENING)
+
+UNIX_EPOCH_JD = 2440587.5
+
+
+def load_tle(path):
+    '''[(name, Satrec)] for every 3-line entry in a TLE file.'''
+    with open(path) as f:
+        lines = [line.rstrip() for line in f if line.strip()]
+    sats = []
+    for i in range(0, len(lines) - 2, 3):
+        sats.append((lines[i].strip(), Satrec.twoline2rv(lines[i + 1], lines[i + 2])))
+    return sats
+
+
+def julian(times):
+    '''Unix times -> (whole, fraction) Julian dates, as sgp4 wants them.'''
+    days = np.asarray(times, float) / 86400.0
+    whole = np.floor(days)
+    return whole + UNIX_EPOCH_JD, days - whole
+
+
+def gmst(jd, fr):
+    '''Greenwich mean sidereal time in radians.'''
+    t = ((jd - 2451545.0) + fr) / 36525
+    seconds = (67310.54841 + (876600.0 * 3600 + 8640184.812866) * t
+               + 0.093104 * t ** 2 - 0.0000062 * t ** 3)
+    return np.radians(seconds / 240.0) % (2 * np.pi)
+
+
+def teme_to_ecef(r, jd, fr):
+    '''
+    (..., times, 3) TEME positions at jd + fr (times long) -> Earth-fixed
+    (ignoring polar motion).
+    '''
+    theta = gmst(jd, fr)
+    c, s = np.cos(theta), np.sin(theta)
+    ecef = np.empty_like(r)
+    ecef[..., 0] = c * r[..., 0] + s * r[..., 1]
+    ecef[..., 1] = -s * r[..., 0] + c * r[..., 1]
+    ecef[..., 2] = r[..., 2]
+    return ecef
+
+
+def geodetic_to_ecef(lat, lon, alt=0.0):
+    '''Degrees and km -> Earth-fixed km.'''
+    lat, lon = np.radians(lat), np.radians(lon)
+    n = EARTH_RADIUS / np.sqrt(1 - E2 * np.sin(lat) ** 2)
+    return np.array([(n + alt) * np.cos(lat) * np.cos(lon),
+                     (n + alt) * np.cos(lat) * np.sin(lon),
+                     (n * (1 - E2) + alt) * np.sin(lat)])
+
+
+def ecef_to_geodetic(ecef):
+    '''Earth-fixed km (..., 3) -> latitude, longitude (degrees) and altitude (km).'''
+    x, y, z = ecef[..., 0], ecef[..., 1], ecef[..., 2]
+    p = np.hypot(x, y)
+    lat = np.arctan2(z, p * (1 - E2))
+    # A few fixed-point steps get it well under a meter
+    for _ in range(3):
+        n = EARTH_RADIUS / np.sqrt(1 - E2 * np.sin(lat) ** 2)
+        alt = p / np.cos(lat) - n
+        lat = np.arctan2(z, p * (1 - E2 * n / (n + alt)))
+    return np.degrees(lat), np.degrees(np.arctan2(y, x)), alt
+
+
+def elevations(ecef, lat, lon, alt=0.0):
+    '''Elevation in degrees of Earth-fixed positions seen from an observer.'''
+    d = ecef - geodetic_to_ecef(lat, lon, alt)
+    phi, lam = np.radians(lat), np.radians(lon)
+    up = (np.cos(phi) * np.cos(lam) * d[:, 0] + np.cos(phi) * np.sin(lam) * d[:, 1]
+          + np.sin(phi) * d[:, 2])
+    return np.degrees(np.arcsin(up / np.linalg.norm(d, axis=1)))
+
+
+def propagate(sat, times):
+    '''Earth-fixed positions (km) at unix times; NaN where SGP4 fails.'''
+    jd, fr = julian(times)
+    error, r, v = sat.sgp4_array(jd, fr)
+    r[error != 0] = np.nan
+    return teme_to_ecef(r, jd, fr)
+
+
+def _crossing(t0, t1, e0, e1, level):
+    # Linear interpolation of when the elevation crosses level
+    return t0 + (t1 - t0) * (level - e0) / (e1 - e0)
+
+
+def predict(sat, lat, lon, alt=0.0, start=None, hours=HOURS, step=STEP,
+            min_elevation=MIN_ELEVATION):
+    '''
+    Passes from start (unix time, default now) for the next hours, as
+    dicts with risetime, settime, duration (seconds) and max_elevation
+    (degrees). A pass already going on at start rises at start.
+    '''
+    if start is None:
+        start = time.time()
+    times = start + np.arange(0, hours * 3600 + step, step)
+    elevation = elevations(propagate(sat, times), lat, lon, alt)
+    above = np.nan_to_num(elevation, nan=-90.0) >= min_elevation
+    # Where runs above the horizon begin and end
+    edges = np.flatnonzero(np.diff(above.astype(np.int8)))
+    rises = list(edges[~above[edges]] + 1)
+    sets = list(edges[above[edges]] + 1)
+    if above[0]:
+        rises.insert(0, 0)
+    if above[-1]:
+        # Still up at the end of the window: leave it to the next table
+        rises.pop()
+    passes = []
+    for i, j in zip(rises, sets):
+        rise = times[0] if i == 0 else _crossing(
+            times[i - 1], times[i], elevation[i - 1], elevation[i], min_elevation)
+        set_ = _crossing(times[j - 1], times[j], elevation[j - 1], elevation[j], min_elevation)
+        passes.append({'risetime': int(round(rise)),
+                       'settime': int(round(set_)),
+                       'duration': int(round(set_ - rise)),
+                       'max_elevation': round(float(elevation[i:j].max()), 1)})
+    return passes
+
+
+class PassCache:
+    '''
+    Pass tables by observer, computed for HOURS at a time and reused
+    until less than refresh hours of them are left.
+    '''
+
+    def __init__(self, sat, hours=HOURS, refresh=HOURS / 2, size=32):
+        self.sat = sat
+        self.hours = hours
+        self.refresh = refresh
+        self.size = size
+        self.tables = OrderedDict()
+        self.lock = threading.Lock()
+        self.computed = 0
+
+    def set_sat(self, sat):
+        '''A new TLE: every table is stale.'''
+        with self.lock:
+            self.sat = sat
+            self.tables.clear()
+
+    def passes(self, lat, lon, alt=0.0, now=None):
+        '''The passes that haven't set yet, for an observer.'''
+        if now is None:
+            now = time.time()
+        # ~100 m is the same observer as far as pass times go
+        key = (round(lat, 3), round(lon, 3), round(alt, 1))
+        with self.lock:
+            table = self.tables.get(key)
+            if table is None or now > table[0] + (self.hours - self.refresh) * 3600:
+                table = (now, predict(self.sat, lat, lon, alt, now, self.hours))
+                self.computed += 1
+            self.tables[key] = table
+            self.tables.move_to_end(key)
+            while len(self.tables) > self.size:
+                self.tables.popitem(last=False)
+        return [p for p in table[1] if p['settime'] > now]
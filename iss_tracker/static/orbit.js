@@ -143,9 +143,11 @@ orbits.util.parseTLE = function(text) {
  * @prop {google.maps.PolylineOptions}  polylineOpts - An instance of google.maps.PolylineOptions
  * @prop {boolean}                      drawShadowPolylines - Whenever to draw indicators when Satellite is shadowed by Earth
  * @prop {google.maps.PolylineOptions}  shadowPolylinesOpts - An instance of google.maps.PolylineOptions
+ * @prop {orbits.Track}                 track        - Precomputed ground track, used instead of the TLE
  */
 orbits.SatelliteOptions = {
     tle: "",
+    track: null,
     title: null,
     pathLength: 1,
     visible: true,
@@ -224,6 +226,7 @@ orbits.Satellite = function(options) {
     // check if we have TLE and init orbit
     if(this.tle !== null && !(this.tle instanceof orbits.TLE)) this.tle = null;
     if(this.tle !== null) this.setTLE(this.tle);
+    if(this.track !== null) this.setTrack(this.track);
 
     // refresh
     this.refresh();
@@ -254,16 +257,28 @@ orbits.Satellite.prototype.setMap = function(map) {
  *Recalculates the position and updates the markers
  */
 orbits.Satellite.prototype.refresh = function() {
-    if(!this.visible || this.orbit === null || this.map === null) return;
+    if(!this.visible || (this.orbit === null && this.track === null) || this.map === null) return;
 
-    this.orbit.setDate(this.date);
-    this.orbit.propagate();
-    this.position = this.orbit.getLatLng();
+    var sample = this._sample((this.date) ? this.date : new Date());
+    if(sample === null) return;
+    this.position = sample.latLng;
     this.marker.setPosition(this.position);
-    var alt = this.orbit.getAltitude() * 1000;
+    var alt = sample.altitude * 1000;
     this.horizon.setRadius(orbits.util.getDistanceToHorizon(alt));
 };
 
+/**
+ * Position and altitude (km) at a date, from the track if there's one
+ * @param   {Date} date - An instance of Date
+ * @returns {Object} {latLng, altitude}, or null if the track doesn't cover date
+ */
+orbits.Satellite.prototype._sample = function(date) {
+    if(this.track !== null) return this.track.sample(date);
+    this.orbit.setDate(date);
+    this.orbit.propagate();
+    return {latLng: this.orbit.getLatLng(), altitude: this.orbit.getAltitude()};
+};
+
 /**
  *Redraw path
  */
@@ -280,8 +295,18 @@ orbits.Satellite.prototype.setTLE = function(tle) {
     this.marker.setTitle(tle.name);
 };
 
+/**
+ * Set a precomputed ground track (from the server's /tracks) for this satellite
+ * @param   {orbits.Track} track - An instance of orbits.Track
+ */
+orbits.Satellite.prototype.setTrack = function(track) {
+    this.track = track;
+    this.marker.setTitle(track.name);
+};
+
 orbits.Satellite.prototype._updatePoly = function() {
-    var dt = (this.orbit.getPeriod() * 1000) / 180;
+    var period = (this.track !== null) ? this.track.period * 60 : this.orbit.getPeriod();
+    var dt = (period * 1000) / 180;
     var date = (this.date) ? this.date : new Date();
     this.path = [];
     this.shadowPolylines.forEach(function(v) { v.setMap(null); });
@@ -296,15 +321,15 @@ orbits.Satellite.prototype._updatePoly = function() {
     var jj = (180 * this.pathLength) + 1;
     for(; i <= jj; i++) {
         curr_date = new Date(date.getTime() + dt*i);
-        this.orbit.setDate(curr_date);
-        this.orbit.propagate();
-        var pos = this.orbit.getLatLng();
+        var sample = this._sample(curr_date);
+        if(sample === null) break;
+        var pos = sample.latLng;
         this.path.push(pos);
 
         if(!this.drawShadowPolylines) continue;
 
         var dist = google.maps.geometry.spherical.computeDistanceBetween(orbits.util.calculateLatLngOfSun(curr_date), pos);
-        curr_night = dist > orbits.util.halfEarthCircumference + orbits.util.getDistanceToHorizon(this.orbit.getAltitude() * 1000);
+        curr_night = dist > orbits.util.halfEarthCircumference + orbits.util.getDistanceToHorizon(sample.altitude * 1000);
 
         if(night === true && curr_night === true) {
             curr_path.push(pos);
@@ -327,6 +352,68 @@ orbits.Satellite.prototype._updatePoly = function() {
     this.polyline.setPath(this.path);
 };
 
+/**
+ * Decodes one series of the server's /tracks: the first value, then
+ * base64 little-endian deltas
+ * @param   {Object} series - {first, dtype, deltas}
+ * @param   {float} scale - Units per degree (or km)
+ * @returns {Float64Array}
+ */
+orbits.util.decodeDeltas = function(series, scale) {
+    var raw = atob(series.deltas);
+    var bytes = new Uint8Array(raw.length);
+    var i;
+    for(i = 0; i < raw.length; i++) bytes[i] = raw.charCodeAt(i);
+    var deltas = (series.dtype == 'int16') ? new Int16Array(bytes.buffer) : new Int32Array(bytes.buffer);
+    var values = new Float64Array(deltas.length + 1);
+    var value = series.first;
+    values[0] = value / scale;
+    for(i = 0; i < deltas.length; i++) {
+        value += deltas[i];
+        values[i + 1] = value / scale;
+    }
+    return values;
+};
+
+/**
+ * Initializes a Track object: a satellite's ground track from the
+ * server's /tracks, interpolated instead of propagated
+ * @class
+ * @param {Object} data - The whole /tracks response
+ * @param {Object} sat - One of data.satellites
+ */
+orbits.Track = function(data, sat) {
+    this.name = sat.name;
+    this.id = sat.id;
+    this.period = sat.period;
+    this.start = data.start * 1000;
+    this.step = data.step * 1000;
+    this.count = sat.count;
+    this.lat = orbits.util.decodeDeltas(sat.lat, data.scale.lat);
+    // Unwrapped: no jumps at the antimeridian, wrapped back in sample()
+    this.lon = orbits.util.decodeDeltas(sat.lon, data.scale.lon);
+    this.alt = orbits.util.decodeDeltas(sat.alt, data.scale.alt);
+};
+
+/**
+ * Linear interpolation between the track's points
+ * @param   {Date} date - An instance of Date
+ * @returns {Object} {latLng, altitude}, or null if date isn't in the track
+ */
+orbits.Track.prototype.sample = function(date) {
+    var x = (date.getTime() - this.start) / this.step;
+    var i = Math.floor(x);
+    if(i < 0 || i + 1 >= this.count) return null;
+    var f = x - i;
+    var lat = this.lat[i] + (this.lat[i+1] - this.lat[i]) * f;
+    var lon = this.lon[i] + (this.lon[i+1] - this.lon[i]) * f;
+    lon = ((lon + 180) % 360 + 360) % 360 - 180;
+    return {
+        latLng: new google.maps.LatLng(lat, lon),
+        altitude: this.alt[i] + (this.alt[i+1] - this.alt[i]) * f
+    };
+};
+
 /**
  * Initializes a TLE object containing parsed TLE
  * @class
@@ -0,0 +1,68 @@
+import time
+
+import pytest
+
+import animate
+import fake_blinkt
+from animate import ZOOM, frames
+from animator import Animator, pattern
+
+# Frames in one repetition of an animation
+REPETITION = len(ZOOM)
+
+
+@pytest.fixture
+def animator(monkeypatch):
+    # Faster frames, same logic
+    monkeypatch.setattr(animate, 'FRAME_TIME', 0.005)
+    fake_blinkt.frames = 0
+    fake_blinkt.last_frame = None
+    return Animator(fake_blinkt)
+
+
+def wait_for_frames(n, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while fake_blinkt.frames < n:
+        assert time.monotonic() < deadline, 'the animation never started'
+        time.sleep(0.001)
+
+
+def last_frame(next_pass):
+    hue, times = pattern(next_pass)
+    return [tuple(rgb) for rgb in frames(hue)[-1].tolist()]
+
+
+def test_newer_post_preempts_the_running_animation(animator):
+    far, now = 3600, 0
+    assert pattern(far) != pattern(now)
+    animator.post(far)
+    wait_for_frames(3)
+    animator.post(now)
+    assert animator.wait_idle(timeout=10)
+    assert animator.played == 2
+    hue, times = pattern(now)
+    cut_short = fake_blinkt.frames - times * REPETITION
+    # The first animation stopped early; the second one played in full
+    assert 3 <= cut_short < pattern(far)[1] * REPETITION
+    assert fake_blinkt.last_frame == last_frame(now)
+
+
+def test_same_animation_plays_to_the_end(animator):
+    animator.post(3600)
+    wait_for_frames(3)
+    # Same pattern: not cut short, played again afterwards
+    animator.post(3000)
+    assert animator.wait_idle(timeout=10)
+    assert animator.played == 2
+    assert fake_blinkt.frames == 2 * pattern(3600)[1] * REPETITION
+
+
+def test_posts_replace_each_other(animator):
+    animator.post(3600)
+    wait_for_frames(3)
+    # Only the newest of the posts made meanwhile gets played
+    for next_pass in (30, 20, 10):
+        animator.post(next_pass)
+    assert animator.wait_idle(timeout=10)
+    assert animator.played == 2
+    assert fake_blinkt.last_frame == last_frame(10)
@@ -0,0 +1,303 @@
+'''
+A catalog of TLEs (two-line element sets) held in one numpy structured
+array, so a file with tens of thousands of objects (e.g. Celestrak's
+active.txt) is a few MB and loads in a fraction of a second:
+
+    catalog = Catalog('static/stations.txt')
+    catalog.lookup([25544])            # rows of the element table
+    catalog.satrecs([25544])           # [(name, Satrec)] for sgp4
+
+Both the 3-line format (name line first) and the bare 2-line one are
+read. Every line's checksum (the last digit: the sum of the digits,
+with '-' counting as 1, modulo 10) is checked, along with the line
+numbers and the catalog number matching on both lines; entries that
+fail are skipped and counted in catalog.rejected.
+
+The fields are parsed column by column for the whole file at once.
+Lookups by catalog number are a binary search over the sorted numbers.
+
+The source can be a file or a URL. refresh() reads it again and swaps
+the new table in only if it parsed and something changed; start()
+does that every so often on a thread. Downloads are saved (to
+cache_file) so a restart without network still has the last good
+catalog. Callbacks in on_change run after every swap.
+'''
+from urllib.request import urlopen
+import hashlib
+import os
+import threading
+import time
+
+try:
+    import numpy as np
+    from sgp4.api import Satrec
+except ImportError:
+    from sys import exit
+    exit('This script requires the numpy and sgp4 modules\n'
+         'Install with: sudo pip install numpy sgp4')
+
+LINE_LENGTH = 69
+REFRESH_HOURS = 12
+TIMEOUT = 30
+
+ELEMENTS = np.dtype([
+    ('satnum', np.int32),
+    ('name', 'S24'),
+    ('epoch', np.float64),          # Julian date
+    ('ndot', np.float64),           # rev/day^2 (/2, as in the TLE)
+    ('nddot', np.float64),          # rev/day^3 (/6)
+    ('bstar', np.float64),          # 1/earth radii
+    ('inclination', np.float64),    # degrees, from here on
+    ('raan', np.float64),
+    ('eccentricity', np.float64),
+    ('argp', np.float64),
+    ('mean_anomaly', np.float64),
+    ('mean_motion', np.float64),    # rev/day
+    ('line1', 'S69'),
+    ('line2', 'S69'),
+])
+
+# Alpha-5 catalog numbers: A0000 is 100000, skipping I and O
+_ALPHA5 = np.full(256, -1, np.int64)
+_ALPHA5[ord('0'):ord('9') + 1] = np.arange(10)
+for _i, _c in enumerate(c for c in 'ABCDEFGHJKLMNPQRSTUVWXYZ'):
+    _ALPHA5[ord(_c)] = 10 + _i
+
+
+def _columns(chars, start, stop):
+    '''Fixed columns start:stop of every line, as a bytes array.'''
+    return np.ascontiguousarray(chars[:, start:stop]).view('S{}'.format(stop - start)).ravel()
+
+
+def _checksum_ok(chars):
+    digits = chars[:, :LINE_LENGTH - 1]
+    value = np.where((digits >= ord('0')) & (digits <= ord('9')), digits - ord('0'), 0)
+    value += digits == ord('-')
+    return value.sum(axis=1) % 10 == chars[:, LINE_LENGTH - 1] - ord('0')
+
+
+def _float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+
+def _floats(field):
+    '''A bytes array -> floats, NaN for whatever isn't a number.'''
+    try:
+        return field.astype(np.float64)
+    except ValueError:
+        # Only a bad line or two in the file: do it the slow way
+        return np.array([_float(value) for value in field.tolist()], np.float64)
+
+
+def _implied(field):
+    '''' 21590-4' style fields (implied decimal point and exponent) -> floats.'''
+    chars = field.view('S1').reshape(len(field), -1)
+    sign = np.where(chars[:, 0] == b'-', -1.0, 1.0)
+    mantissa = _floats(_columns(chars, 1, 6)) / 1e5
+    exponent = _floats(np.char.replace(_columns(chars, 6, 8), b' ', b''))
+    return sign * mantissa * 10.0 ** exponent
+
+
+def _satnums(chars):
+    '''Columns 2:7 of the lines as catalog numbers, -1 where they aren't one.'''
+    first = _ALPHA5[chars[:, 2]]
+    first = np.where(chars[:, 2] == ord(' '), 0, first)
+    digits = chars[:, 3:7].astype(np.int64) - ord('0')
+    ok = (first >= 0) & ((digits >= 0) & (digits <= 9)).all(axis=1)
+    return np.where(ok, first * 10000 + digits @ [1000, 100, 10, 1], -1)
+
+
+def _epochs(field):
+    '''YYDDD.DDDDDDDD -> Julian dates.'''
+    chars = field.view('S1').reshape(len(field), -1)
+    year = _floats(_columns(chars, 0, 2))
+    year = np.nan_to_num(year, nan=0) + np.where(year < 57, 2000, 1900)
+    day = _floats(_columns(chars, 2, 14))
+    jan1 = (year.astype(np.int64) - 1970).astype('datetime64[Y]').astype('datetime64[D]').astype(np.float64)
+    return np.where(np.isnan(day), np.nan, jan1 + 2440587.5 + day - 1)
+
+
+def _rows(sorted_satnums, satnums):
+    '''Indices of satnums in the sorted catalog numbers (binary search).'''
+    satnums = np.atleast_1d(np.asarray(satnums, np.int64))
+    i = np.searchsorted(sorted_satnums, satnums)
+    found = i < len(sorted_satnums)
+    found[found] = sorted_satnums[i[found]] == satnums[found]
+    if not found.all():
+        raise KeyError('not in the catalog: {}'.format(satnums[~found].tolist()))
+    return i
+
+
+def split_entries(text):
+    '''(names, line1s, line2s) of the entries in a TLE file's text.'''
+    lines = text.splitlines()
+    starts = [i for i, (line, following) in enumerate(zip(lines, lines[1:]))
+              if line[:2] == '1 ' and following[:2] == '2 ']
+    names = []
+    for i in starts:
+        name = lines[i - 1].strip() if i and lines[i - 1][:2] not in ('1 ', '2 ') else ''
+        if name.startswith('0 '):
+            # Space-Track's 3le format
+            name = name[2:]
+        names.append(name)
+    return (names, [lines[i].rstrip() for i in starts],
+            [lines[i + 1].rstrip() for i in starts])
+
+
+def parse(text):
+    '''The element table for a TLE file's text, and how many entries were rejected.'''
+    # Anything that isn't ASCII can't be in a valid line anyway
+    text = text.encode('ascii', 'replace').decode('ascii')
+    names, line1s, line2s = split_entries(text)
+    n = len(line1s)
+    if not n:
+        return np.zeros(0, ELEMENTS), 0
+    l1 = np.array(line1s, 'S{}'.format(LINE_LENGTH))
+    l2 = np.array(line2s, 'S{}'.format(LINE_LENGTH))
+    c1 = l1.view(np.uint8).reshape(n, LINE_LENGTH)
+    c2 = l2.view(np.uint8).reshape(n, LINE_LENGTH)
+    satnum = _satnums(c1)
+    ok = ((np.fromiter(map(len, line1s), np.int64, n) == LINE_LENGTH)
+          & (np.fromiter(map(len, line2s), np.int64, n) == LINE_LENGTH)
+          & _checksum_ok(c1) & _checksum_ok(c2)
+          & (satnum >= 0) & (satnum == _satnums(c2)))
+    keep = np.flatnonzero(ok)
+    if not len(keep):
+        return np.zeros(0, ELEMENTS), n
+    c1, c2 = c1[keep], c2[keep]
+
+    table = np.zeros(len(keep), ELEMENTS)
+    table['satnum'] = satnum[keep]
+    table['name'] = [names[i].encode('ascii', 'replace')[:24] for i in keep]
+    table['line1'] = l1[keep]
+    table['line2'] = l2[keep]
+    table['epoch'] = _epochs(_columns(c1, 18, 32))
+    table['ndot'] = _floats(np.char.replace(_columns(c1, 33, 43), b' ', b''))
+    table['nddot'] = _implied(_columns(c1, 44, 52))
+    table['bstar'] = _implied(_columns(c1, 53, 61))
+    table['inclination'] = _floats(_columns(c2, 8, 16))
+    table['raan'] = _floats(_columns(c2, 17, 25))
+    table['eccentricity'] = _floats(_columns(c2, 26, 33)) / 1e7
+    table['argp'] = _floats(_columns(c2, 34, 42))
+    table['mean_anomaly'] = _floats(_columns(c2, 43, 51))
+    table['mean_motion'] = _floats(_columns(c2, 52, 63))
+    # A good checksum on a field that isn't a number is still a bad entry
+    bad = np.zeros(len(table), bool)
+    for name in ELEMENTS.names:
+        if ELEMENTS[name] == np.float64:
+            bad |= np.isnan(table[name])
+    table = table[~bad]
+    rejected = n - len(table)
+    # Sorted by catalog number for the lookups; the latest epoch wins
+    # when an object is listed twice
+    table = table[np.lexsort((-table['epoch'], table['satnum']))]
+    first = np.ones(len(table), bool)
+    first[1:] = table['satnum'][1:] != table['satnum'][:-1]
+    return table[first], rejected
+
+
+class Catalog:
+    def __init__(self, source, cache_file=None, timeout=TIMEOUT):
+        # source: a path or an http(s):// URL
+        self.source = source
+        self.cache_file = cache_file
+        self.timeout = timeout
+        self.table = np.zeros(0, ELEMENTS)
+        # table['satnum'] as a contiguous array, for the binary searches
+        self.satnums = np.zeros(0, np.int32)
+        self.rejected = 0
+        self.digest = None
+        self.version = 0
+        self.loaded = None
+        self.on_change = []
+        self.lock = threading.Lock()
+        self._satrecs = {}
+        self._thread = None
+        self._stop = threading.Event()
+        if cache_file and os.path.isfile(cache_file):
+            with open(cache_file) as f:
+                self.load(f.read())
+        self.refresh()
+
+    def __len__(self):
+        return len(self.table)
+
+    def _read(self):
+        if self.source.startswith(('http://', 'https://')):
+            with urlopen(self.source, timeout=self.timeout) as response:
+                return response.read().decode('ascii', 'replace')
+        with open(self.source) as f:
+            return f.read()
+
+    def refresh(self):
+        '''
+        Read the source again. Returns True if the catalog changed; a
+        source that can't be read or has no valid entry changes nothing.
+        '''
+        try:
+            text = self._read()
+        except (OSError, ValueError) as e:
+            print('TLE refresh from {} failed: {}'.format(self.source, e))
+            return False
+        if not self.load(text):
+            return False
+        if self.cache_file and self.cache_file != self.source:
+            tmp = self.cache_file + '.tmp'
+            with open(tmp, 'w') as f:
+                f.write(text)
+            os.replace(tmp, self.cache_file)
+        return True
+
+    def load(self, text):
+        '''Parse text and swap it in; False if it has no valid entry or is the same.'''
+        digest = hashlib.sha1(text.encode()).hexdigest()
+        if digest == self.digest:
+            return False
+        table, rejected = parse(text)
+        if not len(table):
+            print('TLE source {} has no valid entries, keeping the old ones'.format(self.source))
+            return False
+        with self.lock:
+            # Swapped in one go: readers see the old table or the new one
+            self.table, self.rejected, self.digest = table, rejected, digest
+            self.satnums = np.ascontiguousarray(table['satnum'])
+            self._satrecs = {}
+            self.version += 1
+            self.loaded = time.time()
+        for callback in self.on_change:
+            callback()
+        return True
+
+    def start(self, hours=REFRESH_HOURS):
+        '''Refresh every hours, on a thread.'''
+        def run():
+            while not self._stop.wait(hours * 3600):
+                self.refresh()
+        self._thread = threading.Thread(target=run, name='tle', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def lookup(self, satnums):
+        '''The element table rows for satnums; KeyError for any that isn't there.'''
+        with self.lock:
+            table, sorted_satnums = self.table, self.satnums
+        return table[_rows(sorted_satnums, satnums)]
+
+    def satrecs(self, satnums):
+        '''[(name, Satrec)] for satnums, each built once per catalog version.'''
+        with self.lock:
+            table, sorted_satnums, cache = self.table, self.satnums, self._satrecs
+        sats = []
+        for row in table[_rows(sorted_satnums, satnums)]:
+            sat = cache.get(int(row['satnum']))
+            if sat is None:
+                sat = cache[int(row['satnum'])] = (
+                    row['name'].decode().strip(),
+                    Satrec.twoline2rv(row['line1'].decode(), row['line2'].decode()))
+            sats.append(sat)
+        return sats
@@ -0,0 +1,64 @@
+'''
+Ground tracks of every satellite in a TLE file, for orbit.html to draw
+and interpolate instead of running SGP4 in the kiosk's browser:
+
+    payload = track_payload(load_tle('static/stations.txt'), start, minutes=120, step=30)
+
+All the satellites over all the times are propagated in one call
+(SatrecArray), then turned into latitude, longitude and altitude. Each
+series is sent compactly: quantized to integers (latitude and longitude
+in thousandths of a degree, about 100 m, altitude in meters), the first
+value as is and the rest as differences from the previous point,
+packed little-endian into int16 (int32 if a difference doesn't fit) and
+base64-encoded. Longitude is unwrapped first so it doesn't jump by 360
+at the antimeridian; the client wraps it back.
+'''
+import base64
+import math
+
+import numpy as np
+from sgp4.api import SatrecArray
+
+from passes import ecef_to_geodetic, julian, teme_to_ecef
+
+SCALE = {'lat': 1000, 'lon': 1000, 'alt': 1000}
+
+
+def ground_tracks(sats, times):
+    '''(lat, lon, alt) arrays shaped (satellites, times); NaN where SGP4 fails.'''
+    jd, fr = julian(times)
+    error, r, v = SatrecArray(sats).sgp4(jd, fr)
+    r[error != 0] = np.nan
+    return ecef_to_geodetic(teme_to_ecef(r, jd, fr))
+
+
+def encode_deltas(values):
+    '''Integers -> {'first', 'dtype', 'deltas' (base64)}.'''
+    values = np.asarray(values, np.int64)
+    deltas = np.diff(values)
+    dtype = '<i2' if not len(deltas) or np.abs(deltas).max() < 2 ** 15 else '<i4'
+    return {'first': int(values[0]) if len(values) else 0,
+            'dtype': 'int16' if dtype == '<i2' else 'int32',
+            'deltas': base64.b64encode(deltas.astype(dtype).tobytes()).decode('ascii')}
+
+
+def track_payload(sats, start, minutes, step):
+    '''
+    The /tracks answer for [(name, Satrec)] from start (unix time) for
+    minutes, every step seconds.
+    '''
+    times = start + np.arange(0, minutes * 60 + step, step, dtype=float)
+    lat, lon, alt = ground_tracks([sat for name, sat in sats], times)
+    lon = np.degrees(np.unwrap(np.radians(lon), axis=1))
+    satellites = []
+    for i, (name, sat) in enumerate(sats):
+        # Cut at the first point SGP4 couldn't do (a decayed orbit)
+        valid = ~np.isnan(lat[i])
+        n = len(times) if valid.all() else int(np.argmin(valid))
+        entry = {'name': name, 'id': sat.satnum, 'count': n,
+                 # Minutes per revolution, for the length of the drawn path
+                 'period': 2 * math.pi / sat.no_kozai}
+        for key, series in (('lat', lat[i]), ('lon', lon[i]), ('alt', alt[i])):
+            entry[key] = encode_deltas(np.round(series[:n] * SCALE[key]))
+        satellites.append(entry)
+    return {'start': int(start), 'step': step, 'scale': SCALE, 'satellites': satellites}